@@ -13,6 +13,7 @@ import numpy as np
 import pandas as pd
 import mwc.bayes
 import mwc.stats
+import mwc.schema
 import bokeh.io
 import bokeh.plotting
 import mwc.viz
@@ -21,8 +22,8 @@ import tqdm
 bokeh.io.output_notebook()
 
 # Load in the compiled data
-fluct_data = pd.read_csv('../../data/raw_compiled_lineages.csv', comment='#')
-fc_data = pd.read_csv('../../data/raw_compiled_snaps.csv', comment='#')
+fluct_data = mwc.schema.read_lineages('../../data/raw_compiled_lineages.csv')
+fc_data = mwc.schema.read_snaps('../../data/raw_compiled_snaps.csv')
 
 # Constants and bounds for size
 IP_DIST = 0.065 # In nm / pix
@@ -0,0 +1,41 @@
+# ##############################################################################
+# gp_chunked_prediction.py
+# ------------------------------------------------------------------------------
+# License: MIT
+#
+# Description
+# ------------------------------------------------------------------------------
+# Compares the time and peak memory of `predict`, which also keeps what is
+# needed for the joint covariance of all predictions, with `predictmarginal`,
+# which predicts means and variances of the latent function and its first two
+# derivatives in blocks, on increasingly fine output grids.
+# ##############################################################################
+#%%
+import time
+import tracemalloc
+import numpy as np
+import mwc.gaussianprocess as gp
+
+def profiled(fn, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1E6
+
+bds = {0: (-5, 5), 1: (-6, 2), 2: (-5, 2)}
+rng = np.random.RandomState(42)
+t = np.sort(rng.uniform(0, 1440, 500))
+y = np.log(0.01 + 0.4 / (1 + np.exp(-(t - 600) / 80))) + 0.01 * rng.randn(len(t))
+g = gp.sqexpGP(bds, t, y)
+g.lth_opt = np.array([2.45, -11.3, -7.0])
+for m in [1000, 2500, 5000, 10000]:
+    tnew = np.linspace(0, 1440, m)
+    t_full, mem_full = profiled(g.predict, tnew, derivs=2)
+    t_chunk, mem_chunk = profiled(g.predictmarginal, tnew, derivs=2)
+    print(f'M={m:6d}: predict {t_full:6.2f} s, {mem_full:8.1f} MB | '
+          f'predictmarginal {t_chunk:6.2f} s, {mem_chunk:8.1f} MB')
+
+#%%
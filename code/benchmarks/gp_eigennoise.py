@@ -0,0 +1,46 @@
+# ##############################################################################
+# gp_eigennoise.py
+# ------------------------------------------------------------------------------
+# License: MIT
+#
+# Description
+# ------------------------------------------------------------------------------
+# Counts the decompositions of the kernel matrix and times
+# `findhyperparameters` for a squared exponential Gaussian process with and
+# without `eigennoise`, for both the full and the profile likelihood, on a well
+# of the example plate and on a synthetic curve of 800 points. The eigenvalue
+# path only avoids factorizations when the noise changes alone, which happens
+# in the profile search but not in L-BFGS-B steps, and so `eigennoise` is off
+# by default.
+# ##############################################################################
+#%%
+import time
+import numpy as np
+import pandas as pd
+import mwc.gaussianprocess as gp
+
+data = pd.read_csv('../../data/example_growth_plate.csv')
+well = data[data['well_id'] == 27]
+rng = np.random.RandomState(42)
+x800 = np.linspace(0, 1200, 800)
+y800 = np.log(0.01 + 0.4 / (1 + np.exp(-(x800 - 600) / 80))) \
+    + 0.02 * rng.randn(800)
+curves = {'well 27': (well['time_min'].values,
+                      np.log(well['od_sub'].clip(lower=1E-3).values)),
+          'synthetic': (x800, y800)}
+bds = {0: (-5, 5), 1: (-6, 2), 2: (-5, 2)}
+for name, (x, y) in curves.items():
+    for profile in [False, True]:
+        for eigennoise in [False, True]:
+            g = gp.sqexpGP(bds, x, y)
+            g.eigennoise = eigennoise
+            start = time.perf_counter()
+            g.findhyperparameters(2, seed=0, profile=profile)
+            elapsed = time.perf_counter() - start
+            counts = g.linalgcounts
+            print(f'{name:>9s} (N={len(x):4d}) profile={profile!s:5s} '
+                  f'eigennoise={eigennoise!s:5s}: {elapsed:6.2f} s, '
+                  f'{counts["cholesky"]:5d} Cholesky, {counts["eigen"]:3d} '
+                  f'eigen, nlml {g.nlml_opt:.3f}')
+
+#%%
@@ -0,0 +1,51 @@
+# ##############################################################################
+# gp_kernel_assembly.py
+# ------------------------------------------------------------------------------
+# License: MIT
+#
+# Description
+# ------------------------------------------------------------------------------
+# Compares the row-by-row assembly of the kernel matrix K(X,X) and its
+# hyperparameter Jacobian with the broadcasted assembly used by
+# `mwc.gaussianprocess` for each of the covariance classes.
+# ##############################################################################
+#%%
+import time
+import numpy as np
+import mwc.gaussianprocess as gp
+
+def rowwise(g, x, lth):
+    k = np.empty((len(x), len(x)))
+    jk = np.empty((len(x), len(x), g.noparams))
+    for i in range(len(x)):
+        k[i, :], jk[i, :, :] = g.covfn(x[i], x, lth)
+    return k, jk
+
+def broadcast(g, x, lth):
+    return g.covmatrix(x, x, lth)
+
+def best_of(fn, *args, repeats=3):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return np.min(times)
+
+kernels = {'lnGP': 2, 'nnGP': 2, 'sqexpGP': 2, 'sqexplinGP': 3, 'maternGP': 2}
+for n in [100, 500, 1000, 2000]:
+    x = np.linspace(0, 1200, n)
+    y = np.log(0.01 + 0.4 / (1 + np.exp(-(x - 600) / 80)))
+    for name, noparams in kernels.items():
+        bds = {i: (-2, 2) for i in range(noparams + 1)}
+        g = getattr(gp, name)(bds, x, y)
+        lth = np.zeros(noparams + 1)
+        k_row, jk_row = rowwise(g, x, lth)
+        k_vec, jk_vec = broadcast(g, x, lth)
+        assert np.allclose(k_row, k_vec) and np.allclose(jk_row, jk_vec)
+        t_row = best_of(rowwise, g, x, lth)
+        t_vec = best_of(broadcast, g, x, lth)
+        print(f'N={n:5d} {name:>11s}: row-wise {t_row * 1E3:8.2f} ms, '
+              f'broadcast {t_vec * 1E3:8.2f} ms, speedup {t_row / t_vec:6.1f}x')
+
+#%%
@@ -0,0 +1,42 @@
+# ##############################################################################
+# gp_statespace_matern.py
+# ------------------------------------------------------------------------------
+# License: MIT
+#
+# Description
+# ------------------------------------------------------------------------------
+# Compares the dense Matern Gaussian process (`maternGP`) with its state-space
+# (Kalman filter) form (`maternssGP`) for evaluating the log likelihood and its
+# Jacobian and for predicting the latent function and its first two derivatives
+# on irregularly sampled growth curves of increasing length.
+# ##############################################################################
+#%%
+import time
+import numpy as np
+import mwc.gaussianprocess as gp
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+bds = {0: (-5, 5), 1: (-4, 4), 2: (-5, 2)}
+lth = np.log([0.5, 150, 1E-4])
+rng = np.random.RandomState(42)
+for n in [250, 500, 1000, 2000, 4000]:
+    t = np.sort(rng.uniform(0, 1440, n))
+    y = np.log(0.01 + 0.4 / (1 + np.exp(-(t - 600) / 80))) + 0.01 * rng.randn(n)
+    dense = gp.maternGP(bds, t, y)
+    ss = gp.maternssGP(bds, t, y)
+    dense.lth_opt = ss.lth_opt = lth
+    t_like = [timed(g.nlml, lth) for g in [dense, ss]]
+    t_jac = [timed(g.nlmljac, lth) for g in [dense, ss]]
+    assert np.allclose(dense.jacnlml(lth), ss.jacnlml(lth))
+    t_pred = [timed(g.predict, t, derivs=2) for g in [dense, ss]]
+    err = np.max(np.abs(dense.df - ss.df)) / np.max(np.abs(dense.df))
+    print(f'N={n:5d}: likelihood dense {t_like[0]:7.3f} s, state-space {t_like[1]:7.3f} s | '
+          f'Jacobian dense {t_jac[0]:7.3f} s, state-space {t_jac[1]:7.3f} s | '
+          f'prediction dense {t_pred[0]:7.3f} s, state-space {t_pred[1]:7.3f} s | '
+          f'relative difference in df {err:.1e}')
+
+#%%
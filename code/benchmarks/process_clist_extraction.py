@@ -0,0 +1,79 @@
+# ##############################################################################
+# process_clist_extraction.py
+# ------------------------------------------------------------------------------
+# License: MIT
+#
+# Description
+# ------------------------------------------------------------------------------
+# Compares the previous row-by-row extraction of cell properties from a
+# SuperSegger clist, which loaded every variable of the `.mat` file and
+# appended one cell at a time, with `mwc.process.clist_to_dataframe`, which
+# loads only `def` and `data` and slices all cells at once, on synthetic clists
+# of increasing size.
+# ##############################################################################
+#%%
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import scipy.io
+import mwc.process
+
+def legacy_clist_to_dataframe(clist_file, added_props={}, ip_dist=0.065):
+    mat = scipy.io.loadmat(clist_file, squeeze_me=True)
+    desired_props = ['Area birth', 'Area death', 'Cell ID', 'Cell birth time',
+                     'Cell death time', 'Daughter1 ID', 'Daughter2 ID',
+                     'Fluor1 mean death', 'Fluor2 mean death', 'Mother ID',
+                     'Long axis (L) death', 'Long axis (L) birth',
+                     'Short axis death', 'Short axis birth', 'Fluor1 bg death',
+                     'Fluor2 bg death', 'Error frame', 'Cell Dist to Edge']
+    defs = {key: value for value, key in enumerate(mat['def'])
+            if key in desired_props}
+    desired_props += list(added_props.keys())
+    df = pd.DataFrame([], columns=desired_props)
+    for cell in mat['data']:
+        cell_dict = {key: cell[value] for key, value in defs.items()}
+        cell_dict.update(added_props)
+        # `DataFrame.append` was removed from pandas; this is its equivalent.
+        df = pd.concat([df, pd.DataFrame([cell_dict])], ignore_index=True)
+    new_cols = {nom: '_'.join(nom.split(' ')).lower() for nom in df.keys()}
+    new_cols['Long axis (L) death'] = 'long_axis_death'
+    new_cols['Long axis (L) birth'] = 'long_axis_birth'
+    df.rename(columns=new_cols, inplace=True)
+    for ax in ['short_axis_death', 'long_axis_death', 'short_axis_birth',
+               'long_axis_birth']:
+        df[ax] = df[ax] * ip_dist
+    df['aspect_ratio'] = df['short_axis_death'] / df['long_axis_death']
+    for stage in ['death', 'birth']:
+        w, l = df[f'short_axis_{stage}'], df[f'long_axis_{stage}']
+        df[f'volume_{stage}'] = 0.5 * np.pi * w**2 * ((2 * w / 3) + l - w)
+    return df
+
+# Use the property names of a real clist.
+names = ['Cell ID', 'Region num birth', 'Region num death', 'Cell birth time',
+         'Cell death time', 'Cell age', 'Old pole age', 'Error frame', 'stat0',
+         'Long axis (L) birth', 'Long axis (L) death', 'Short axis birth',
+         'Short axis death', 'Area birth', 'Area death', 'Mother ID',
+         'Daughter1 ID', 'Daughter2 ID', 'Fluor1 mean death',
+         'Fluor2 mean death', 'Fluor1 bg death', 'Fluor2 bg death',
+         'Cell dist to edge']
+names += [f'Unused property {i}' for i in range(101 - len(names))]
+rng = np.random.RandomState(42)
+tmpdir = tempfile.mkdtemp()
+for n in [500, 2000, 5000]:
+    fname = os.path.join(tmpdir, f'clist_{n}.mat')
+    scipy.io.savemat(fname, {'def': np.array(names, dtype=object),
+                             'data': rng.uniform(1, 100, (n, len(names))),
+                             'data3D': rng.uniform(1, 100, (n, 50, 20))})
+    start = time.perf_counter()
+    old = legacy_clist_to_dataframe(fname, added_props={'position': 1})
+    t_old = time.perf_counter() - start
+    start = time.perf_counter()
+    new = mwc.process.clist_to_dataframe(fname, added_props={'position': 1})
+    t_new = time.perf_counter() - start
+    pd.testing.assert_frame_equal(old.astype(float), new.astype(float))
+    print(f'N={n:5d} cells: row-by-row {t_old:7.2f} s, vectorized '
+          f'{t_new:6.3f} s, speedup {t_old / t_new:7.1f}x')
+
+#%%
@@ -0,0 +1,80 @@
+# ##############################################################################
+# process_family_reunion.py
+# ------------------------------------------------------------------------------
+# License: MIT
+#
+# Description
+# ------------------------------------------------------------------------------
+# Compares the previous pairing of sibling cells, which looped over every
+# (position, mother) group of a lineage table, with the sorted array pairing
+# used by `mwc.process.family_reunion` on synthetic lineage tables of
+# increasing size. The loop is only timed up to 100,000 cells.
+# ##############################################################################
+#%%
+import time
+import numpy as np
+import pandas as pd
+import mwc.process
+
+def legacy_family_reunion(dilution_df, fluo_channel=2):
+    # Rows are collected in a list rather than with the quadratic
+    # `DataFrame.append`, which was removed from pandas.
+    rows = []
+    for (pos, mom), d in dilution_df.groupby(['position', 'mother_id']):
+        if len(d) == 2:
+            ints = d[f'fluor{fluo_channel}_mean_death'].values
+            if sum(ints) > 0:
+                rows.append({'I_1': ints[0], 'I_2': ints[1], 'parent_ID': mom,
+                             'sibling_ID_1': d['cell_id'].values[0],
+                             'sibling_ID_2': d['cell_id'].values[1],
+                             'error_frame': d['error_frame'].values[0],
+                             'area_1': d['area_death'].values[0],
+                             'area_2': d['area_death'].values[1],
+                             'position': pos,
+                             'length_1_birth': d['long_axis_birth'].values[0],
+                             'length_2_birth': d['long_axis_birth'].values[1],
+                             'length_1_death': d['long_axis_death'].values[0],
+                             'length_2_death': d['long_axis_death'].values[1],
+                             'volume_1_birth': d['volume_birth'].values[0],
+                             'volume_2_birth': d['volume_birth'].values[1],
+                             'volume_1_death': d['volume_death'].values[0],
+                             'volume_2_death': d['volume_death'].values[1],
+                             'fractional_birth_area': d['area_birth'].values[0] /
+                             np.sum(d['area_birth'].values)})
+    return pd.DataFrame(rows)
+
+def synthetic_lineages(n, rng):
+    # Most mothers divide into two daughters; some lose a daughter or gain a
+    # spurious third, and some daughters have no fluorescence.
+    n_moms = n // 2
+    sizes = rng.choice([1, 2, 3], size=n_moms, p=[0.05, 0.9, 0.05])
+    moms = np.repeat(np.arange(n_moms), sizes)
+    cells = len(moms)
+    df = pd.DataFrame({'position': rng.randint(1, 20, n_moms)[moms],
+                       'mother_id': moms, 'cell_id': np.arange(cells),
+                       'error_frame': np.where(rng.rand(cells) < 0.1, 3, np.nan)})
+    for c in ['fluor2_mean_death', 'area_death', 'area_birth',
+              'long_axis_birth', 'long_axis_death', 'volume_birth',
+              'volume_death']:
+        df[c] = rng.uniform(0, 100, cells)
+    df.loc[rng.rand(cells) < 0.05, 'fluor2_mean_death'] = 0
+    return df.sample(frac=1, random_state=rng).reset_index(drop=True)
+
+rng = np.random.RandomState(42)
+for n in [10000, 100000, 1000000, 3000000]:
+    lineages = synthetic_lineages(n, rng)
+    start = time.perf_counter()
+    new = mwc.process.family_reunion(lineages)
+    t_new = time.perf_counter() - start
+    if n <= 100000:
+        start = time.perf_counter()
+        old = legacy_family_reunion(lineages)
+        t_old = time.perf_counter() - start
+        pd.testing.assert_frame_equal(old[new.columns].astype(float),
+                                      new.astype(float))
+        print(f'N={n:8d} cells: loop {t_old:7.2f} s, vectorized {t_new:6.3f} s, '
+              f'speedup {t_old / t_new:6.1f}x')
+    else:
+        print(f'N={n:8d} cells: vectorized {t_new:6.3f} s')
+
+#%%
@@ -0,0 +1,34 @@
+# ##############################################################################
+# schema_memory.py
+# ------------------------------------------------------------------------------
+# License: MIT
+#
+# Description
+# ------------------------------------------------------------------------------
+# Compares the memory and read time of the compiled lineage and snapshot
+# tables read as untyped CSVs with the same tables read with the dtypes of
+# `mwc.schema`. The tables are made by `batch_processing.py` or `mwc-process`.
+# ##############################################################################
+#%%
+import time
+import pandas as pd
+import mwc.schema
+
+tables = {'lineages': ('../../data/raw_compiled_lineages.csv',
+                       mwc.schema.read_lineages),
+          'snapshots': ('../../data/raw_compiled_snaps.csv',
+                        mwc.schema.read_snaps)}
+for name, (fname, reader) in tables.items():
+    start = time.perf_counter()
+    untyped = pd.read_csv(fname, comment='#')
+    t_untyped = time.perf_counter() - start
+    start = time.perf_counter()
+    typed = reader(fname)
+    t_typed = time.perf_counter() - start
+    mem_untyped = untyped.memory_usage(deep=True).sum() / 1E6
+    mem_typed = typed.memory_usage(deep=True).sum() / 1E6
+    print(f'{name:>9s} ({len(typed)} rows): untyped {mem_untyped:7.1f} MB, '
+          f'{t_untyped:5.2f} s | schema {mem_typed:7.1f} MB, {t_typed:5.2f} s '
+          f'| {mem_untyped / mem_typed:4.1f}x smaller')
+
+#%%
@@ -81,6 +81,66 @@ def plotxyerr(x, y, xerr, yerr, xlabel= 'x', ylabel= 'y', title= '', color= 'b',
 
 
 
+######
+def samplestats(t, fs, gs, logs= True):
+    '''
+    Returns the max df, the time of max df, the inverse max df, the max of the data, and the lag time for samples of a fit and its time derivative.
+
+    Arguments
+    --
+    t: array of time points
+    fs: samples of the fit with time as the first axis and samples as the last axis
+    gs: the corresponding samples of the time derivative
+    logs: if True, the fit is of the logarithm of the data
+    '''
+    t= np.asarray(t)
+    im= np.argmax(gs, 0)
+    mgr= np.take_along_axis(gs, im[None], 0)[0]
+    tmgr= t[im]
+    dt= np.log(2)/mgr
+    if logs:
+        md= np.exp(np.max(fs, axis= 0))
+    else:
+        md= np.max(fs, axis= 0)
+    lagtime= tmgr + (fs[0] - np.take_along_axis(fs, im[None], 0)[0])/mgr
+    return [mgr, tmgr, dt, md, lagtime]
+
+######
+def samplemoments(draw, t, nosamples, logs= True, chunksize= 256):
+    '''
+    Returns the means and variances of the statistics calculated by samplestats, accumulating running moments over chunks of samples so that memory does not grow with the number of samples.
+
+    Arguments
+    --
+    draw: a function returning a given number of samples of the fit and its time derivatives stacked along the first axis, such as the sample method of a Gaussian process
+    t: array of time points
+    nosamples: total number of samples
+    logs: if True, the fit is of the logarithm of the data
+    chunksize: number of samples drawn at a time
+    '''
+    n= len(t)
+    count, mn, m2= 0, 0, 0
+    for start in range(0, nosamples, chunksize):
+        m= min(chunksize, nosamples - start)
+        fghs= draw(m)
+        st= np.array(samplestats(t, fghs[:n], fghs[n:2*n], logs))
+        cmn= np.mean(st, -1)
+        cm2= np.sum((st - cmn[..., None])**2, -1)
+        # combine with the moments of the previous chunks
+        delta= cmn - mn
+        mn= mn + delta*m/(count + m)
+        m2= m2 + cm2 + delta**2*count*m/(count + m)
+        count += m
+    return mn, m2/count
+
+######
+# bounds for hyperparameters
+# (sparse approximations share the bounds of their covariance functions)
+gpbounds= {'nn': {0 : (-1,5), 1: (-7,-2), 2: (-6,2)},
+           'sqexp': {0: (-5,5), 1: (-6,2), 2: (-5,2)},
+           'matern': {0: (-5,5), 1: (-4,4), 2: (-5,2)}}
+gpbounds.update({'sparse' + cv: gpbounds[cv] for cv in ['nn', 'sqexp', 'matern']})
+
 ######
 
 
@@ -137,7 +197,8 @@ class fitderiv:
     def __init__(self, t, d, cvfn= 'sqexp', noruns= 5, exitearly= False, figs= False, bd= False,
                  esterrs= False, optmethod= 'l_bfgs_b', nosamples= 100, logs= True,
                  gui= False, figtitle= False, ylabel= 'y', stats= True, statnames= False,
-                 showstaterrors= True, warn= False, linalgmax= 3):
+                 showstaterrors= True, warn= False, linalgmax= 3, workers= 1, engine= 'dense',
+                 hpcache= False, hpkey= False):
         '''
         Runs a Gaussian process to fit data and estimate the time-derivative
 
@@ -145,7 +206,7 @@ class fitderiv:
         --
         t: array of time points
         d: array of data with replicates in columns
-        cvfn: kernel function for the Gaussian process used in the fit - 'sqexp' (squared exponential: default), 'matern' (Matern with nu= 5/2), or 'nn' (neural network)
+        cvfn: kernel function for the Gaussian process used in the fit - 'sqexp' (squared exponential: default), 'matern' (Matern with nu= 5/2), or 'nn' (neural network), or, for long time series, the sparse (inducing-point) approximations 'sparsesqexp', 'sparsematern', or 'sparsenn'
         noruns: number of fitting attempts made (default is 5)
         exitearly: if True, stop at the first successful fit; if False, take the best fit from all successful fits
         figs: plot the results of the fit
@@ -162,6 +223,10 @@ class fitderiv:
         showstaterrors: if True, display estimated errors for statistics
         warn: if False, warnings created by covariance matrices that are not positive semi-definite are stopped
         linalgmax: number of attempts (default is 3) if a linear algebra (numerical) error is generated
+        workers: number of processes used to make the fitting attempts in parallel (default is 1)
+        engine: 'dense' (default) for the standard Gaussian process or 'statespace' for a Kalman filter, which gives the same results in a time linear in the number of data points but is only available for cvfn= 'matern'
+        hpcache: if specified, a gaussianprocess.hyperparametercache used to start fitting from the best-fit hyperparameters of similar data, which allows fewer fitting attempts
+        hpkey: a dictionary of metadata, such as {'carbon': 'glucose', 'temp': 37}, identifying similar data in hpcache
         '''
         self.version= '1.03'
         self.ylabel= ylabel
@@ -177,10 +242,6 @@ class fitderiv:
         self.noreps= noreps
         self.t= t
         self.d= d
-        # bounds for hyperparameters
-        bnn= {0 : (-1,5), 1: (-7,-2), 2: (-6,2)}
-        bsqexp= {0: (-5,5), 1: (-6,2), 2: (-5,2)}
-        bmatern= {0: (-5,5), 1: (-4,4), 2: (-5,2)}
         # take log of data
         self.origd= d
         if logs:
@@ -218,17 +279,24 @@ class fitderiv:
                     merrors= esterrs
         if not np.any(merrors):
             print('Fitting measurement errors.')
+        # choose the class of Gaussian process
+        if engine == 'statespace':
+            if cvfn != 'matern':
+                raise gp.gaussianprocessException('The state-space engine is only available for the matern covariance function.')
+            gpname= cvfn + 'ssGP'
+        else:
+            gpname= cvfn + 'GP'
         # display details of covariance functions
         try:
             if bd:
-                bds= mergedicts(original= eval('b' + cvfn), update= bd)
+                bds= mergedicts(original= gpbounds[cvfn], update= bd)
             else:
-                bds= eval('b' + cvfn)
+                bds= gpbounds[cvfn]
             if not gui:
-                gt= getattr(gp, cvfn + 'GP')(bds, t, d)
+                gt= getattr(gp, gpname)(bds, t, d)
                 print('Using a ' + gt.description + '.')
                 gt.info()
-        except NameError:
+        except KeyError:
             print('Gaussian process not recognized.')
             from sys import exit
             exit()
@@ -246,8 +314,9 @@ class fitderiv:
         else:
             ma= False
         # run Gaussian process
-        g= getattr(gp, cvfn + 'GP')(bds, ta, da, merrors= ma)
-        g.findhyperparameters(noruns, exitearly= exitearly, optmethod= optmethod, linalgmax= linalgmax)
+        g= getattr(gp, gpname)(bds, ta, da, merrors= ma)
+        g.findhyperparameters(noruns, exitearly= exitearly, optmethod= optmethod, linalgmax= linalgmax,
+                              workers= workers, hpcache= hpcache, hpkey= hpkey)
         # display results of fit
         if gui:
             print('log(max likelihood)= %e' % (-g.nlml_opt))
@@ -261,22 +330,20 @@ class fitderiv:
             g.results()
         g.predict(t, derivs= 2, merrorsnew= merrors)
         fmnp= g.mnp
-        fcovp= g.covp
         # save results
         self.g= g
         self.logmaxlike= -g.nlml_opt
         self.hparamerr= g.hparamerr
         self.lth= g.lth_opt
         self.fmnp= fmnp
-        self.fcovp= fcovp
         self.t= t
         self.d= d
         self.f= fmnp[:len(t)]
         self.df= fmnp[len(t):2*len(t)]
         self.ddf= fmnp[2*len(t):]
-        self.fvar= np.diag(fcovp)[:len(t)]
-        self.dfvar= np.diag(fcovp)[len(t):2*len(t)]
-        self.ddfvar= np.diag(fcovp)[2*len(t):]
+        self.fvar= g.fvar
+        self.dfvar= g.dfvar
+        self.ddfvar= g.ddfvar
         self.merrors= merrors
         if stats: self.calculatestats(nosamples, statnames, showstaterrors)
         if figs:
@@ -295,7 +362,52 @@ class fitderiv:
 
 
 
-    def sample(self, nosamples, newt= False):
+    def compact(self, factor= False):
+        '''
+        Returns a fitresult, which keeps the fit, its time derivatives, their variances, the statistics, and what is needed to rebuild the Gaussian process but not the Gaussian process itself, and records in its savedbytes the memory saved.
+
+        Arguments
+        --
+        factor: if True, also keep the Cholesky factor of the kernel matrix so that the Gaussian process can be rebuilt without factorizing (not available for sparse and state-space Gaussian processes)
+        '''
+        g= self.g
+        fr= fitresult()
+        for a in ['t', 'd', 'f', 'fvar', 'df', 'dfvar', 'ddf', 'ddfvar', 'lth', 'logmaxlike',
+                  'hparamerr', 'merrors', 'logs', 'ylabel', 'bds']:
+            setattr(fr, a, getattr(self, a))
+        for a in ['ds', 'stats', 'nosamples']:
+            setattr(fr, a, getattr(self, a, None))
+        fr.gpname= g.__class__.__name__
+        fr.x, fr.y, fr.gpmerrors= g.x, g.y, g.merrors
+        fc= getattr(g, '_factorcache', None)
+        if factor and fc is not None and 'L' in fc and np.array_equal(fc['lth'], self.lth):
+            fr.factor= {'L': fc['L'][0], 'lower': fc['L'][1], 'al': fc['al'], 'jitter': fc['jitter']}
+        else:
+            fr.factor= None
+        fr.savedbytes= arraybytes(self) - arraybytes(fr)
+        return fr
+
+
+    def save(self, fname):
+        '''
+        Saves the fit, the statistics, the best-fit hyperparameters, the data, and the Cholesky factor of the kernel matrix as a .npz file, which can be reloaded without refitting using loadfit.
+
+        Arguments
+        --
+        fname: name of the file
+        '''
+        self.compact(factor= True).save(fname)
+
+
+    @property
+    def fcovp(self):
+        '''
+        The full covariance matrix of the fit and its first two derivatives, which is only calculated when needed (None for Gaussian processes that do not calculate the full covariance matrix).
+        '''
+        return getattr(self.g, 'covp', None)
+
+
+    def sample(self, nosamples, newt= False, rank= False):
         '''
         Generate sample values for the latent function and its first two derivatives (returned as a tuple).
 
@@ -303,18 +415,19 @@ class fitderiv:
         ---
         nosamples: number of samples
         newt: if False, the orginal time points are used; if an array, samples are made for those time points
+        rank: if specified, samples are made using only this number of the largest eigenvalues of the covariance matrix of the fit (not used by sparse and state-space Gaussian processes)
         '''
         if np.any(newt):
             newt= np.asarray(newt)
             import copy
             # make prediction for new time points
-            gps= copy.deepcopy(g)
+            gps= copy.deepcopy(self.g)
             gps.predict(newt, derivs= 2)
         else:
             newt= self.t
             gps= self.g
         noreps= self.noreps
-        fghs= gps.sample(nosamples)
+        fghs= gps.sample(nosamples, rank= rank)
         f= fghs[:len(newt),:]
         g= fghs[len(newt):2*len(newt),:]
         h= fghs[2*len(newt):,:]
@@ -353,7 +466,7 @@ class fitderiv:
 
 
 
-    def calculatestats(self, nosamples= 100, statnames= False, showerrors= True):
+    def calculatestats(self, nosamples= 100, statnames= False, showerrors= True, chunksize= 256):
         '''
         Calculates statistics from best-fit curve and its inferred time derivative - 'max df', 'time of max df', 'inverse max grad', 'max f', 'lag time'.
 
@@ -362,6 +475,7 @@ class fitderiv:
         nosamples: number of samples used to estimate errors in the statistics
         statnames: a list of alternative names for the statistics
         showerrors: display estimated errors for statistics
+        chunksize: number of samples drawn at a time
         '''
         print('\nCalculating statistics with ' + str(nosamples) + ' samples')
         if showerrors: print('\t(displaying mean +/- standard deviation [standard error])\n')
@@ -369,23 +483,12 @@ class fitderiv:
             self.stats= statnames
         else:
             self.stats= ['max df', 'time of max df', 'inverse max df', 'max ' + self.ylabel, 'lag time']
-        t, noreps= self.t, self.noreps
-        fs, gs, hs= self.sample(nosamples)
         # calculate stats
-        im= np.argmax(gs, 0)
-        mgr= gs[im, np.arange(nosamples)]
-        tmgr= np.array([t[i] for i in im])
-        dt= np.log(2)/mgr
-        if self.logs:
-            md= np.exp(np.max(fs, axis= 0))
-        else:
-            md= np.max(fs, axis= 0)
-        lagtime= tmgr + (fs[0, np.arange(nosamples)] - fs[im, np.arange(nosamples)])/mgr
-        # store stats
+        mn, var= samplemoments(self.g.sample, self.t, nosamples, self.logs, chunksize)
         ds= {}
-        for stname, st in zip(self.stats, [mgr, tmgr, dt, md, lagtime]):
-            ds[stname]= np.mean(st)
-            ds[stname + ' var']= np.var(st)
+        for i, stname in enumerate(self.stats):
+            ds[stname]= mn[i]
+            ds[stname + ' var']= var[i]
         self.ds= ds
         self.nosamples= nosamples
         self.printstats(showerrors= showerrors)
@@ -475,9 +578,9 @@ class fitderiv:
         ods= self.origd
         data= [self.t, self.f, np.sqrt(self.fvar), self.df, np.sqrt(self.dfvar), ods]
         if ods.ndim == 1:
-            labels= ['t', 'log(OD)', 'log(OD) error', 'gr', 'gr error', 'od']
+            labels= ['t'] + curvelabels(self.logs) + ['gr', 'gr error', 'od']
         else:
-            labels= ['t', 'log(OD)', 'log(OD) error', 'gr', 'gr error'] + ['od']*ods.shape[1]
+            labels= ['t'] + curvelabels(self.logs) + ['gr', 'gr error'] + ['od']*ods.shape[1]
         orgdata= np.column_stack(data)
         # make dataframes
         if rows:
@@ -514,6 +617,576 @@ class fitderiv:
         return df
 
 
+#####
+
+
+class batchfitderiv:
+    '''
+    to fit many data sets measured at the same time points, such as the wells of a plate, and estimate their time derivatives using Gaussian processes
+
+    A typical work flow is:
+
+    from fitderiv import batchfitderiv
+    q= batchfitderiv(t, ods, groups= carbons)
+    plot(q.t, q.df)
+
+    Data sets in the same group share the hyperparameters of one Gaussian process so that for each set of hyperparameters the kernel matrix is factorized only once and all data sets in the group are fit together. By default, all data sets are in one group.
+
+    Results are stored as arrays with one column for each data set
+        q.f, q.fvar : best-fit and its variance
+        q.df, q.dfvar : fitted first time-derivative and its variance
+        q.ddf, q.ddfvar : fitted second time-derivative and its variance
+    and the best-fit hyperparameters and maximum log likelihood for each group are stored in the dictionaries q.lth and q.logmaxlike.
+
+    Statistics are stored in a dictionary, q.ds, with the same keys as for fitderiv but with an array of values, one for each data set.
+    '''
+
+    def __init__(self, t, d, cvfn= 'sqexp', groups= False, noruns= 5, exitearly= False, bd= False,
+                 optmethod= 'l_bfgs_b', nosamples= 100, logs= True, ylabel= 'y', stats= True,
+                 statnames= False, linalgmax= 3, workers= 1, hpcache= False, hpkey= False):
+        '''
+        Runs Gaussian processes to fit data and estimate the time-derivatives
+
+        Arguments
+        --
+        t: array of time points
+        d: array of data with one data set in each column
+        cvfn: kernel function for the Gaussian process used in the fit - 'sqexp' (squared exponential: default), 'matern' (Matern with nu= 5/2), or 'nn' (neural network)
+        groups: if specified, an array with a label for each data set; data sets with the same label share hyperparameters
+        noruns: number of fitting attempts made for each group (default is 5)
+        exitearly: if True, stop at the first successful fit; if False, take the best fit from all successful fits
+        bd: can be used to change the limits on the hyperparameters for the Gaussian process used in the fit
+        optmethod: the optimization method to maximize the likelihood - 'l_bfgs_b' or 'tnc'
+        nosamples: number of samples taken to estimate errors in statistics
+        logs: if True, the natural logarithm is taking of the data points before fitting
+        ylabel: label used for the statistic of the maximum of the data
+        stats: if True, summary statistics of fit and inferred derivative are calculated
+        statnames: a list for specializing the names of the statistics
+        linalgmax: number of attempts (default is 3) if a linear algebra (numerical) error is generated
+        workers: number of processes used to make the fitting attempts in parallel (default is 1)
+        hpcache: if specified, a gaussianprocess.hyperparametercache used to start fitting from the best-fit hyperparameters of similar data, which allows fewer fitting attempts
+        hpkey: a dictionary of metadata identifying similar data in hpcache, to which the group is added
+        '''
+        if cvfn not in ['nn', 'sqexp', 'matern']:
+            raise gp.gaussianprocessException('Batched fitting is only available for the nn, sqexp, and matern covariance functions.')
+        t= np.asarray(t)
+        d= np.asarray(d, dtype= float)
+        if d.ndim == 1:
+            d= d[:,None]
+        self.ylabel= ylabel
+        self.logs= logs
+        self.t= t
+        self.origd= d
+        if logs:
+            if np.any(d < 0):
+                print('Negative data found, but all data must be positive if taking logs.')
+                print('Ignoring request to take logs.')
+            else:
+                d= np.log(d)
+        self.d= d
+        # all data sets must be measured at the same time points
+        keep= ~np.any(np.isnan(d), 1)
+        if not np.all(keep):
+            print('Ignoring ' + str(np.sum(~keep)) + ' time points with missing data.')
+        if np.any(groups):
+            groups= np.asarray(groups)
+            if len(groups) != d.shape[1]:
+                raise gp.gaussianprocessException('Each data set requires a group.')
+        else:
+            groups= np.zeros(d.shape[1], dtype= int)
+        self.groups= groups
+        if bd:
+            bds= mergedicts(original= gpbounds[cvfn], update= bd)
+        else:
+            bds= gpbounds[cvfn]
+        self.bds= bds
+        # run one Gaussian process for each group
+        self.f, self.df, self.ddf= [np.empty(d.shape) for i in range(3)]
+        self.fvar, self.dfvar, self.ddfvar= [np.empty(d.shape) for i in range(3)]
+        self.gps, self.lth, self.logmaxlike= {}, {}, {}
+        for grp in dict.fromkeys(groups):
+            cols= np.nonzero(groups == grp)[0]
+            g= getattr(gp, cvfn + 'GP')(bds, t[keep], d[keep][:,cols])
+            g.findhyperparameters(noruns, exitearly= exitearly, optmethod= optmethod,
+                                  linalgmax= linalgmax, workers= workers, hpcache= hpcache,
+                                  hpkey= dict(hpkey or {}, group= grp))
+            g.predict(t, derivs= 2)
+            self.f[:,cols]= g.mnp[:len(t)]
+            self.df[:,cols]= g.mnp[len(t):2*len(t)]
+            self.ddf[:,cols]= g.mnp[2*len(t):]
+            self.fvar[:,cols]= g.fvar[:,None]
+            self.dfvar[:,cols]= g.dfvar[:,None]
+            self.ddfvar[:,cols]= g.ddfvar[:,None]
+            self.gps[grp]= g
+            self.lth[grp]= g.lth_opt
+            self.logmaxlike[grp]= -g.nlml_opt
+        if stats: self.calculatestats(nosamples, statnames)
+
+
+
+    def calculatestats(self, nosamples= 100, statnames= False, chunksize= 256):
+        '''
+        Calculates statistics for each data set from its best-fit curve and inferred time derivative - 'max df', 'time of max df', 'inverse max grad', 'max f', 'lag time'.
+
+        Arguments
+        --
+        nosamples: number of samples used to estimate errors in the statistics
+        statnames: a list of alternative names for the statistics
+        chunksize: number of samples drawn at a time
+        '''
+        if statnames:
+            self.stats= statnames
+        else:
+            self.stats= ['max df', 'time of max df', 'inverse max df', 'max ' + self.ylabel, 'lag time']
+        t= self.t
+        ds= {}
+        for stname in self.stats:
+            ds[stname]= np.empty(self.d.shape[1])
+            ds[stname + ' var']= np.empty(self.d.shape[1])
+        for grp, g in self.gps.items():
+            cols= np.nonzero(self.groups == grp)[0]
+            # samples for all data sets in the group from one covariance matrix
+            mn, var= samplemoments(g.sample, t, nosamples, self.logs, chunksize)
+            for i, stname in enumerate(self.stats):
+                ds[stname][cols]= mn[i]
+                ds[stname + ' var'][cols]= var[i]
+        self.ds= ds
+        self.nosamples= nosamples
+
+
+#####
+def arraybytes(obj, seen= None):
+    '''
+    Returns the number of bytes used by the numpy arrays held by an object, including those in its attributes and in any dictionaries, lists, and tuples.
+
+    Arguments
+    --
+    obj: any object
+    '''
+    if seen is None: seen= set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    elif isinstance(obj, dict):
+        return sum(arraybytes(v, seen) for v in obj.values())
+    elif isinstance(obj, (list, tuple)):
+        return sum(arraybytes(v, seen) for v in obj)
+    elif hasattr(obj, '__dict__') or hasattr(obj, '__slots__'):
+        attrs= list(getattr(obj, '__dict__', {}).values())
+        attrs += [getattr(obj, a) for a in getattr(obj, '__slots__', []) if hasattr(obj, a)]
+        return sum(arraybytes(v, seen) for v in attrs)
+    else:
+        return 0
+
+######
+
+
+class fitresult:
+    '''
+    a compact summary of a fit made by fitderiv, created by fitderiv.compact(), that keeps the fit and its time derivatives with their variances (q.f, q.fvar, q.df, q.dfvar, q.ddf, q.ddfvar), the statistics (q.ds), and the best-fit hyperparameters (q.lth) but not the Gaussian process, which can be rebuilt when needed
+
+    A typical work flow is:
+
+    q= fitderiv(t, od).compact()
+    print(q.savedbytes)
+    q.plotfit('df')
+    f, df, ddf= q.sample(100)
+    '''
+    __slots__= ['t', 'd', 'f', 'fvar', 'df', 'dfvar', 'ddf', 'ddfvar', 'lth', 'logmaxlike', 'hparamerr',
+                'merrors', 'logs', 'ylabel', 'bds', 'ds', 'stats', 'nosamples', 'gpname', 'x', 'y',
+                'gpmerrors', 'factor', 'savedbytes']
+    # attributes saved as arrays if not False
+    arraynames= ['t', 'd', 'f', 'fvar', 'df', 'dfvar', 'ddf', 'ddfvar', 'lth', 'merrors', 'x', 'y',
+                 'gpmerrors']
+
+    def rebuild(self, newt= False):
+        '''
+        Returns the Gaussian process of the fit, with predictions for the original time points or for newt, rebuilt from the data and best-fit hyperparameters without refitting.
+
+        Arguments
+        --
+        newt: if an array, predictions are made for those time points
+        '''
+        g= getattr(gp, self.gpname)(self.bds, self.x, self.y, merrors= self.gpmerrors)
+        g.lth_opt= self.lth
+        g.nlml_opt= -self.logmaxlike
+        g.hparamerr= self.hparamerr
+        if self.factor is not None:
+            fc= self.factor
+            g._factorcache= {'lth': np.asarray(self.lth, dtype= float).copy(), 'L': (fc['L'], fc['lower']),
+                             'al': fc['al'], 'kjac': None, 'jitter': fc['jitter']}
+        if np.any(newt):
+            g.predict(np.asarray(newt), derivs= 2)
+        else:
+            g.predict(self.t, derivs= 2, merrorsnew= self.merrors)
+        return g
+
+
+    def sample(self, nosamples, newt= False, rank= False):
+        '''
+        Generate sample values for the latent function and its first two derivatives (returned as a tuple) from the rebuilt Gaussian process.
+
+        Arguments
+        ---
+        nosamples: number of samples
+        newt: if False, the orginal time points are used; if an array, samples are made for those time points
+        rank: if specified, samples are made using only this number of the largest eigenvalues of the covariance matrix of the fit
+        '''
+        n= len(newt) if np.any(newt) else len(self.t)
+        fghs= self.rebuild(newt).sample(nosamples, rank= rank)
+        return fghs[:n,:], fghs[n:2*n,:], fghs[2*n:,:]
+
+    def save(self, fname):
+        '''
+        Saves the fit as an uncompressed .npz file, which can be reloaded with loadfit.
+
+        Arguments
+        --
+        fname: name of the file
+        '''
+        sd= {a: np.asarray(getattr(self, a)) for a in self.arraynames
+             if not (getattr(self, a) is False or getattr(self, a) is None)}
+        # the indices and bounds of hyperparameters at a bound are stored separately to keep their types
+        sd['hparamerr_index']= np.array([int(el[0]) for el in self.hparamerr], dtype= int)
+        sd['hparamerr_bound']= np.array([str(el[1]) for el in self.hparamerr], dtype= str)
+        sd['logmaxlike']= np.asarray(self.logmaxlike)
+        sd['logs']= np.asarray(self.logs)
+        sd['ylabel']= np.asarray(self.ylabel)
+        sd['gpname']= np.asarray(self.gpname)
+        sd['bds']= np.array([self.bds[i] for i in sorted(self.bds)], dtype= float)
+        if self.ds is not None:
+            sd['stats']= np.asarray(self.stats)
+            sd['statmeans']= np.array([self.ds[st] for st in self.stats])
+            sd['statvars']= np.array([self.ds[st + ' var'] for st in self.stats])
+            sd['nosamples']= np.asarray(self.nosamples)
+        if self.factor is not None:
+            for k, v in self.factor.items():
+                sd['factor_' + k]= np.asarray(v)
+        np.savez(fname, **sd)
+
+    plotfit= fitderiv.plotfit
+    printstats= fitderiv.printstats
+
+######
+def npzmemmap(fname):
+    '''
+    Returns a dictionary of the arrays in an uncompressed .npz file with all non-empty arrays memory-mapped from the file rather than read.
+
+    Arguments
+    --
+    fname: name of the file
+    '''
+    import struct
+    import zipfile
+    fmt= np.lib.format
+    arrays= {}
+    with zipfile.ZipFile(fname) as zf, open(fname, 'rb') as fh:
+        for info in zf.infolist():
+            name= info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                # compressed arrays cannot be mapped
+                arrays[name]= fmt.read_array(zf.open(info))
+                continue
+            # skip the local header of the zip member to reach the .npy data
+            fh.seek(info.header_offset + 26)
+            namelen, extralen= struct.unpack('<HH', fh.read(4))
+            fh.seek(info.header_offset + 30 + namelen + extralen)
+            version= fmt.read_magic(fh)
+            if version == (1, 0):
+                shape, fortran, dtype= fmt.read_array_header_1_0(fh)
+            else:
+                shape, fortran, dtype= fmt.read_array_header_2_0(fh)
+            if dtype.hasobject or len(shape) == 0 or 0 in shape:
+                fh.seek(info.header_offset + 30 + namelen + extralen)
+                arrays[name]= fmt.read_array(fh)
+            else:
+                arrays[name]= np.memmap(fname, dtype= dtype, mode= 'r', offset= fh.tell(), shape= shape,
+                                        order= 'F' if fortran else 'C')
+    return arrays
+
+######
+def loadfit(fname, mmap= False):
+    '''
+    Returns a fitresult loaded from a .npz file saved by fitderiv.save or fitresult.save.
+
+    The Gaussian process can then be rebuilt to sample or to predict at new time points without refitting:
+
+    q= loadfit('fit.npz')
+    q.rebuild(np.linspace(0, 1200, 500))
+
+    Arguments
+    --
+    fname: name of the file
+    mmap: if True, arrays are memory-mapped from the file rather than read
+    '''
+    if mmap:
+        sd= npzmemmap(fname)
+    else:
+        with np.load(fname) as z:
+            sd= {k: z[k] for k in z.files}
+    fr= fitresult()
+    for a in fr.arraynames:
+        setattr(fr, a, sd[a] if a in sd else False)
+    if 'hparamerr_index' in sd:
+        fr.hparamerr= [[int(i), str(b)] for i, b in zip(sd['hparamerr_index'], sd['hparamerr_bound'])]
+    else:
+        # files saved with hparamerr as a single array of strings
+        fr.hparamerr= [[int(i), str(b)] for i, b in sd.get('hparamerr', [])]
+    fr.logmaxlike= float(sd['logmaxlike'])
+    fr.logs= bool(sd['logs'])
+    fr.ylabel= str(sd['ylabel'])
+    fr.gpname= str(sd['gpname'])
+    fr.bds= {i: tuple(b.tolist()) for i, b in enumerate(sd['bds'])}
+    if 'stats' in sd:
+        fr.stats= [str(st) for st in sd['stats']]
+        fr.ds= {}
+        for st, mn, var in zip(fr.stats, sd['statmeans'], sd['statvars']):
+            fr.ds[st]= float(mn)
+            fr.ds[st + ' var']= float(var)
+        fr.nosamples= int(sd['nosamples'])
+    else:
+        fr.stats, fr.ds, fr.nosamples= None, None, None
+    if 'factor_L' in sd:
+        fr.factor= {'L': sd['factor_L'], 'lower': bool(sd['factor_lower']), 'al': sd['factor_al'],
+                    'jitter': float(sd['factor_jitter'])}
+    else:
+        fr.factor= None
+    fr.savedbytes= 0
+    return fr
+
+######
+# options of fitderiv for the first fit of fitexpwindow, which override those of the fit of the window
+# (a single optimization run often finds a flat fit with large noise)
+firstpassargs= {'noruns': 5, 'exitearly': False, 'optmethod': 'l_bfgs_b', 'stats': False, 'hpcache': False}
+
+######
+def curvelabels(logs):
+    '''
+    Returns the labels of a fitted curve and of its error: 'log(OD)' and 'log(OD) error' if the logarithm of the data was fitted and 'OD' and 'OD error' otherwise.
+
+    Arguments
+    --
+    logs: if True, the fit is of the logarithm of the data
+    '''
+    return ['log(OD)', 'log(OD) error'] if logs else ['OD', 'OD error']
+
+######
+def findexpwindow(df, frac= 0.8, minpoints= 5):
+    '''
+    Returns the first and last indices of the exponential window: the contiguous region around the maximum of the time derivative of the logarithm of the data where the derivative is at least frac times its maximum.
+
+    Arguments
+    --
+    df: the time derivative of the logarithm of the data
+    frac: fraction of the maximum derivative that defines the window
+    minpoints: minimum number of points in the window
+    '''
+    df= np.asarray(df)
+    im= int(np.argmax(df))
+    inwindow= df >= frac*df[im]
+    i0, i1= im, im
+    while i0 > 0 and inwindow[i0-1]:
+        i0 -= 1
+    while i1 < len(df) - 1 and inwindow[i1+1]:
+        i1 += 1
+    # widen towards the larger derivative until there are enough points
+    while i1 - i0 + 1 < min(minpoints, len(df)):
+        if i0 > 0 and (i1 == len(df) - 1 or df[i0-1] >= df[i1+1]):
+            i0 -= 1
+        else:
+            i1 += 1
+    return i0, i1
+
+######
+def fitexpwindow(t, d, frac= 0.8, minpoints= 5, mind= 0.01, firstpass= 100, firstargs= False, **fitargs):
+    '''
+    Fits data only in its exponential window, which is found from a cheap first fit of all the data, and returns a dictionary of the growth rate, the doubling time, and the start and end of the window, and the fitderiv instance of the fit of the window.
+
+    The growth rate and doubling time are the 'max df' and 'inverse max df' statistics of the fit of the window (or, if no statistics are calculated, from the maximum of its time derivative).
+
+    The window is only used if the maximum growth rate of the first fit is positive and the window lies where the data are rising, between their minimum and the time at which they first reach 95% of their rise; otherwise a warning is printed and all the data are fitted, with the window spanning all the time points.
+
+    Arguments
+    --
+    t: array of time points
+    d: array of data
+    frac: fraction of the maximum growth rate of the first fit that defines the window (see findexpwindow)
+    minpoints: minimum number of points of the first fit in the window
+    mind: the window only includes data greater than mind, avoiding the noisy logarithm of data close to zero
+    firstpass: maximum number of points used in the first fit, which are taken evenly from the data
+    firstargs: a dictionary of keyword arguments for fitderiv for the first fit (by default, the first fit uses fitargs updated with firstpassargs)
+    fitargs: keyword arguments for fitderiv for the fit of the window
+    '''
+    t, d= np.asarray(t), np.asarray(d)
+    step= max(1, int(np.ceil(len(t)/firstpass)))
+    fa= dict(fitargs, **firstpassargs)
+    if firstargs: fa.update(firstargs)
+    q0= fitderiv(t[::step], d[::step], **fa)
+    dm= d[::step] if d.ndim == 1 else np.mean(d[::step], 1)
+    if not np.any(dm > mind):
+        raise gp.gaussianprocessException('No data are greater than ' + str(mind) + ' to find an exponential window.')
+    df= np.where(dm > mind, q0.df, -np.inf)
+    i0, i1= findexpwindow(df, frac, minpoints)
+    # the data rise from their minimum until they first reach 95% of their rise
+    ld= np.log(np.where(dm > mind, dm, np.nan)) if q0.logs else np.where(dm > mind, dm, np.nan)
+    imin= int(np.nanargmin(ld))
+    irise= imin + int(np.argmax(ld[imin:] >= ld[imin] + 0.95*(np.nanmax(ld[imin:]) - ld[imin])))
+    if np.max(df) > 0 and imin <= i0 and i1 <= irise:
+        tstart, tend= t[::step][i0], t[::step][i1]
+    else:
+        print('Warning: no exponential window found - fitting all the data.')
+        tstart, tend= t[0], t[-1]
+    iw= (t >= tstart) & (t <= tend)
+    q= fitderiv(t[iw], d[iw], **fitargs)
+    if hasattr(q, 'ds'):
+        mgr, mgrstd= q.ds[q.stats[0]], np.sqrt(q.ds[q.stats[0] + ' var'])
+        dt, dtstd= q.ds[q.stats[2]], np.sqrt(q.ds[q.stats[2] + ' var'])
+    else:
+        mgr, mgrstd= np.max(q.df), np.nan
+        dt, dtstd= np.log(2)/mgr, np.nan
+    res= {'growth rate': mgr, 'growth rate std': mgrstd, 'doubling time': dt, 'doubling time std': dtstd,
+          'window start': tstart, 'window end': tend}
+    return res, q
+
+######
+def fitwell(t, d, seed, fitargs, window= False):
+    '''
+    Fits one data set with fitderiv, suppressing its output, and returns a dictionary of its statistics, a dictionary of the fit and the inferred time derivative, and None, or, if the fit fails, None, None, and the error.
+
+    Arguments
+    --
+    t: array of time points
+    d: array of data
+    seed: seed for numpy's random number generator
+    fitargs: dictionary of keyword arguments for fitderiv
+    window: if True or a dictionary of keyword arguments for fitexpwindow, only the exponential window of the data is fitted and the growth rate, doubling time, and window are added to the statistics
+
+    The fit is returned with the time points ('t') and data ('d') that were fitted and is labelled by curvelabels.
+    '''
+    import io, contextlib
+    try:
+        np.random.seed(seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            if window:
+                res, q= fitexpwindow(t, d, **dict(window if isinstance(window, dict) else {}, **fitargs))
+                iw= (t >= res['window start']) & (t <= res['window end'])
+                t, d= t[iw], d[iw]
+            else:
+                res, q= {}, fitderiv(t, d, **fitargs)
+            statd= q.printstats(performprint= False) if hasattr(q, 'ds') else {}
+            statd.update(res)
+        flabel, ferrlabel= curvelabels(q.logs)
+        curve= {'t': t, 'd': d, flabel: q.f, ferrlabel: np.sqrt(q.fvar), 'gr': q.df,
+                'gr error': np.sqrt(q.dfvar)}
+        return statd, curve, None
+    except Exception as e:
+        return None, None, repr(e)
+
+
+def fitwellcached(t, d, seed, fitargs, window= False):
+    '''
+    Fits one data set with fitwell, using the copy of a hyperparametercache in fitargs['hpcache'], and returns the results of fitwell and the updates of the copy as a tuple of its new or changed entries and its hits, misses, and converged counters, which can be added to the original cache with its merge method.
+
+    Arguments
+    --
+    t: array of time points
+    d: array of data
+    seed: seed for numpy's random number generator
+    fitargs: dictionary of keyword arguments for fitderiv
+    window: if True or a dictionary of keyword arguments for fitexpwindow, only the exponential window of the data is fitted
+    '''
+    hc= fitargs['hpcache']
+    old= dict(hc.entries)
+    res= fitwell(t, d, seed, fitargs, window)
+    new= {k: v for k, v in hc.entries.items() if old.get(k) != v}
+    return res, (new, hc.hits, hc.misses, hc.converged)
+
+
+def fitplate(data, time= 'time_min', od= 'od_sub', well= 'well_id', metadata= ['carbon', 'temp_C'],
+             workers= 1, verbose= True, seed= None, window= False, **fitargs):
+    '''
+    Fits the growth curve of every well in a long-format table, such as a plate of growth curves, with fitderiv and returns three DataFrames: the statistics of each well in tidy format (with columns for the well, the metadata, 'parameter', and 'value'), the fitted curves (labelled by curvelabels) and growth rates of each well, and the wells whose fits failed with their errors.
+
+    A failed fit does not stop the fitting of the other wells.
+
+    Arguments
+    --
+    data: a pandas DataFrame with one row per measurement
+    time: the column of the times of measurement
+    od: the column of the measured data
+    well: the column identifying each well
+    metadata: columns describing each well, such as the carbon source, that are included in the results
+    workers: number of processes over which the wells are distributed (default is 1)
+    verbose: if True, display a progress bar
+    seed: if specified, the seed from which the seeds of each well are generated so that results do not depend on workers
+    window: if True or a dictionary of keyword arguments for fitexpwindow, each well is fitted only in its exponential window, which is found automatically, and its growth rate, doubling time, and window start and end are included in the statistics
+    fitargs: keyword arguments passed to fitderiv, such as cvfn, noruns, nosamples, and hpcache
+
+    With workers > 1, each well is fitted with a copy of any hpcache, starting from the hyperparameters in the cache when fitting began, and the hyperparameters found and the counters of the copies are added to hpcache, and saved to its file, by this process alone.
+    '''
+    import pandas as pd
+    if verbose:
+        import tqdm
+    metadata= [m for m in metadata if m in data.columns]
+    wells= []
+    for w, wd in data.groupby(well, sort= True):
+        md= wd[metadata].iloc[0].to_dict()
+        wd= wd.dropna(subset= [time, od]).sort_values(time)
+        wells.append((w, wd[time].values, wd[od].values, md))
+    if seed is None:
+        seeds= np.random.randint(2**31 - 1, size= len(wells))
+    else:
+        seeds= np.random.RandomState(seed).randint(2**31 - 1, size= len(wells))
+    results= {}
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        hpcache= fitargs.get('hpcache', False)
+        with ProcessPoolExecutor(max_workers= workers) as pool:
+            if hpcache:
+                # copies of the cache in the other processes would neither update hpcache nor write its file safely
+                futures= {pool.submit(fitwellcached, t, d, sd, dict(fitargs, hpcache= hpcache.copy()), window): w
+                          for (w, t, d, md), sd in zip(wells, seeds)}
+            else:
+                futures= {pool.submit(fitwell, t, d, sd, fitargs, window): w
+                          for (w, t, d, md), sd in zip(wells, seeds)}
+            iterator= as_completed(futures)
+            if verbose:
+                iterator= tqdm.tqdm(iterator, total= len(futures), desc= 'Fitting wells')
+            for future in iterator:
+                if hpcache:
+                    results[futures[future]], updates= future.result()
+                    hpcache.merge(*updates)
+                else:
+                    results[futures[future]]= future.result()
+    else:
+        iterator= zip(wells, seeds)
+        if verbose:
+            iterator= tqdm.tqdm(iterator, total= len(wells), desc= 'Fitting wells')
+        for (w, t, d, md), sd in iterator:
+            results[w]= fitwell(t, d, sd, fitargs, window)
+    # collect results in the order of the wells
+    stats, curves, errors= [], [], []
+    for w, t, d, md in wells:
+        statd, curve, err= results[w]
+        if err is not None:
+            errors.append(dict({well: w}, **md, error= err))
+            continue
+        stats.append(pd.DataFrame(dict({well: w}, **md, parameter= list(statd.keys()),
+                                       value= list(statd.values()))))
+        # only the fitted time points if the fit is of the exponential window
+        t, d= curve.pop('t'), curve.pop('d')
+        curves.append(pd.DataFrame(dict({well: w}, **md, **{time: t, od: d}, **curve)))
+    if errors and verbose:
+        print('Warning: fitting failed for ' + str(len(errors)) + ' of ' + str(len(wells)) + ' wells.')
+    empty= lambda cols: pd.DataFrame(columns= [well] + metadata + cols)
+    stats= pd.concat(stats, ignore_index= True) if stats else empty(['parameter', 'value'])
+    curves= pd.concat(curves, ignore_index= True) if curves else empty([time, od])
+    errors= pd.DataFrame(errors) if errors else empty(['error'])
+    return stats, curves, errors
+
+
 #####
 
 if __name__ == '__main__': print(fitderiv.__doc__)
@@ -24,6 +24,10 @@
 
     will plot three samples of the prior latent functions with hyperparameters 1.0, 0.1, 3.1, and 1.3. There is no need to specify the hyperparameter for measurement error: it is not used to generate prior functions.
 
+    For long time series, sparse approximations using inducing points (sparsesqexpGP, sparsematernGP, sparsennGP, and sparsesqexplinGP) reduce the cost of fitting and predicting from O(N^3) to O(N M^2) for M inducing points.
+
+    Hyperparameters optimized for one data set can start the optimization for similar data sets using a hyperparametercache.
+
     N.B. small (close to zero) values of the estimated measurement error can lead to instabilities in finding the hyperparameters.
 """
 
@@ -31,8 +35,18 @@ import numpy as np
 from scipy import linalg
 import matplotlib.pyplot as plt
 
+# covariance functions between predictions and data and prior variances of predictions for f, df, and ddf
+crossnames= ['covfn', 'd1covfn', 'd12covfn']
+priornames= ['covfn', 'd1d2covfn', 'd12d22covfn']
+
 
 class gaussianprocess:
+    # range of the jitter, relative to the mean of the diagonal, added to kernel matrices that cannot otherwise be factorized
+    minjitter= 1e-10
+    maxjitter= 1e-4
+    # whether the negative log marginal likelihood can be found from the eigenvalues of the kernel matrix when only the noise changes (opt-in: it pays off only with findhyperparameters(profile= True))
+    eigennoise= False
+
     def __init__(self, lthbounds, x, y, merrors= False):
         '''
         Creates a Gaussian process.
@@ -42,12 +56,19 @@ class gaussianprocess:
         lthbounds: a dictionary of pairs of the bounds on the hyperparameters in log10 space,
         such as {0: [0,6], 1: [-3,4], 2: [-6,-4]}
         x: a 1-d array of the abscissa data
-        y: a multi-dimensional array of the ordinate data
+        y: a 1-d array of the ordinate data or a 2-d array with one column for each data set measured at x (the data sets then share the hyperparameters and each kernel matrix is factorized once for all of them)
         merrors: if specified, a 1-d array of the measurement errors (as variances)
         v'''
         self.b= [lthbounds[a] for a in lthbounds.keys()]
         self.x, self.y, self.xnew= x, y, x
         self.merrors= merrors
+        self._factorcache= None
+        self._eigcache= None
+        self._predcov= None
+        # numbers of Cholesky factorizations, of those needing jitter, of eigendecompositions, and of likelihoods found from eigenvalues
+        self.linalgcounts= {'cholesky': 0, 'jitter': 0, 'eigen': 0, 'noiseonly': 0}
+        # largest relative jitter needed
+        self.jitterused= 0
 
 
     def covfn(self):
@@ -61,6 +82,57 @@ class gaussianprocess:
         raise NotImplementedError(' No second derivative of the covariance function specified in class %s' % self.__class__.__name__)
 
 
+    def covfnblocks(self, x, xp, lth, names):
+        '''
+        Returns a list of the covariance function and its derivatives named in names, such as ['covfn', 'd1covfn', 'd12covfn'], evaluated for x and xp.
+
+        Arguments
+        --
+        x: an array of abscissa
+        xp: an array of alternative abscissa (broadcast against x)
+        lth: the log of the hyperparameters
+        names: the names of the methods for the covariance function and its derivatives
+        '''
+        return [getattr(self, name)(x, xp, lth)[0] for name in names]
+
+
+    def covmatrix(self, x, xp, lth, blocksize= 2**15):
+        '''
+        Returns the matrix of the covariance function between all pairs of x and xp and its Jacobian (with the hyperparameters as the last axis).
+
+        The covariance function is broadcast over blocks of rows of the matrix so that temporary arrays stay small.
+
+        Arguments
+        --
+        x: a 1-d array of abscissa
+        xp: a 1-d array of alternative abscissa
+        lth: the log of the hyperparameters
+        blocksize: the (approximate) number of matrix elements evaluated at once
+        '''
+        x, xp= np.asarray(x), np.asarray(xp)
+        k= np.empty((len(x), len(xp)))
+        jk= np.empty((len(x), len(xp), self.noparams))
+        step= max(1, blocksize//max(1, len(xp)))
+        for i in range(0, len(x), step):
+            k[i:i+step], jk[i:i+step]= self.covfn(x[i:i+step,None], xp[None,:], lth)
+        return k, jk
+
+
+    def noisevariance(self, lth, n):
+        """
+        Returns the variance of the measurement noise at each of n abscissa values.
+
+        Arguments
+        --
+        lth: log of the hyperparameters
+        n: number of abscissa values
+        """
+        if np.any(self.merrors):
+            return np.exp(lth[-1])*np.asarray(self.merrors)
+        else:
+            return np.exp(lth[-1])*np.ones(n)
+
+
     def kernelmatrix(self, lth, x):
         """
         Returns kernel matrix K(X,X) supplemented with measurement noise and its Cholesky decomposition.
@@ -71,17 +143,110 @@ class gaussianprocess:
         x: abscissa values
         merrors: if specified, rescales the fitted measurement error
         """
-        k= np.empty((len(x), len(x)))
-        for i in range(len(x)):
-            k[i,:]= self.covfn(x[i], x, lth)[0]
-        if np.any(self.merrors):
-            kn= k + np.exp(lth[-1])*np.diag(self.merrors)
-        else:
-            kn= k + np.exp(lth[-1])*np.identity(len(x))
-        L= linalg.cho_factor(kn)
+        k= self.covmatrix(x, x, lth)[0]
+        kn= k + np.diag(self.noisevariance(lth, len(x)))
+        L= self.cholesky(kn)[0]
         return k, L
 
 
+    def cholesky(self, k, lower= False):
+        """
+        Returns the Cholesky decomposition of a kernel matrix, as given by linalg.cho_factor, and the jitter, relative to the mean of the diagonal, that was added to the diagonal to allow the decomposition.
+
+        No jitter is added if the kernel matrix can be decomposed. Otherwise the jitter is increased by factors of ten from .minjitter until the decomposition succeeds or .maxjitter is exceeded, when a linear algebra error is raised. The number of decompositions that need jitter and the largest jitter used are recorded in .linalgcounts['jitter'] and .jitterused.
+
+        Arguments
+        --
+        k: a symmetric matrix
+        lower: if True, return the lower triangular decomposition
+        """
+        self.linalgcounts['cholesky'] += 1
+        try:
+            return linalg.cho_factor(k, lower= lower), 0
+        except np.linalg.LinAlgError:
+            scale= np.mean(np.diagonal(k))
+            jitter= self.minjitter
+            while jitter <= self.maxjitter:
+                try:
+                    L= linalg.cho_factor(k + jitter*scale*np.identity(len(k)), lower= lower,
+                                         overwrite_a= True)
+                except np.linalg.LinAlgError:
+                    jitter *= 10
+                else:
+                    self.linalgcounts['jitter'] += 1
+                    self.jitterused= max(self.jitterused, jitter)
+                    return L, jitter
+            raise np.linalg.LinAlgError('Kernel matrix is not positive definite even with a jitter of '
+                                        + str(self.maxjitter))
+
+
+    def factorize(self, lth, jac= False):
+        """
+        Returns a dictionary with the Cholesky decomposition of the kernel matrix for the data (.x) at lth ('L'), the solution of K alpha = y ('al'), the relative jitter needed for the decomposition ('jitter'), and, if jac is True, the Jacobian of the kernel matrix ('kjac').
+
+        The results are cached so that the negative log marginal likelihood and its Jacobian, which are requested separately at the same hyperparameters, share one factorization.
+
+        Arguments
+        --
+        lth: log of the hyperparameters
+        jac: if True, the Jacobian of the kernel matrix is also returned
+        """
+        lth= np.asarray(lth, dtype= float)
+        fc= self._factorcache
+        if fc is None or not np.array_equal(fc['lth'], lth) or (jac and fc['kjac'] is None):
+            x, y= self.x, self.y
+            k, kjac= self.covmatrix(x, x, lth)
+            k[np.diag_indices_from(k)] += self.noisevariance(lth, len(x))
+            L, jitter= self.cholesky(k)
+            fc= {'lth': lth.copy(), 'L': L, 'al': linalg.cho_solve(L, y),
+                 'kjac': kjac if jac else None, 'jitter': jitter}
+            self._factorcache= fc
+        return fc
+
+
+    def eigendecompose(self, lth):
+        """
+        Returns a dictionary with the eigenvalues ('lam') and eigenvectors ('Q') of the kernel matrix for the data (.x) without measurement noise, which depends on all but the last of the hyperparameters ('lths'), the projection of the data onto the eigenvectors ('Qy'), and the Jacobian of the kernel matrix ('kjac').
+
+        For homoscedastic noise, the kernel matrix with noise has the same eigenvectors, and the negative log marginal likelihood can be found for any level of noise in O(N). The results are cached for the most recent lths.
+
+        Arguments
+        --
+        lth: log of the hyperparameters (the last, for the noise, is ignored)
+        """
+        lth= np.asarray(lth, dtype= float)
+        ec= self._eigcache
+        if ec is None or not np.array_equal(ec['lths'], lth[:-1]):
+            x= self.x
+            k, kjac= self.covmatrix(x, x, lth)
+            lam, Q= linalg.eigh(k, overwrite_a= True)
+            self.linalgcounts['eigen'] += 1
+            # remove negative eigenvalues from round-off
+            ec= {'lths': lth[:-1].copy(), 'lam': np.maximum(lam, 0), 'Q': Q, 'Qy': np.dot(Q.T, self.y),
+                 'kjac': kjac, 'Mjac': None, 'nojac': 0}
+            self._eigcache= ec
+        return ec
+
+
+    def noiseonly(self, lth):
+        """
+        Returns True if the noise is homoscedastic and lth differs only in the noise from the hyperparameters of the most recent factorization or eigendecomposition, which can then be used to find the negative log marginal likelihood and its Jacobian.
+
+        Arguments
+        --
+        lth: log of the hyperparameters
+        """
+        if not self.eigennoise or np.any(self.merrors):
+            return False
+        lth= np.asarray(lth, dtype= float)
+        ec, fc= self._eigcache, self._factorcache
+        if ec is not None and np.array_equal(ec['lths'], lth[:-1]):
+            return True
+        else:
+            return (fc is not None and np.array_equal(fc['lth'][:-1], lth[:-1])
+                    and fc['lth'][-1] != lth[-1])
+
+
     def nlml(self, lth):
         """
         Returns negative of log marginal likelihood.
@@ -90,11 +255,19 @@ class gaussianprocess:
         --
         lth: log of the hyperparameters
         """
-        x, y= self.x, self.y
-        k, L= self.kernelmatrix(lth, x)
-        al= linalg.cho_solve(L, y)
-        halfdetK= np.sum(np.log(np.diagonal(L[0])))
-        return 0.5*np.dot(y, al) + halfdetK + 0.5*len(y)*np.log(2*np.pi)
+        y= self.y
+        nocols= np.size(y)//len(self.x)
+        if self.noiseonly(lth):
+            # use the eigenvalues of the kernel matrix
+            ec= self.eigendecompose(lth)
+            d= ec['lam'] + np.exp(lth[-1])
+            self.linalgcounts['noiseonly'] += 1
+            return (0.5*np.dot(np.sum(np.reshape(ec['Qy'], (len(d), -1))**2, 1), 1/d)
+                    + 0.5*nocols*np.sum(np.log(d)) + 0.5*np.size(y)*np.log(2*np.pi))
+        fc= self.factorize(lth)
+        halfdetK= np.sum(np.log(np.diagonal(fc['L'][0])))
+        # each column of a 2-d y is an independent data set sharing the kernel matrix
+        return 0.5*np.vdot(y, fc['al']) + nocols*halfdetK + 0.5*np.size(y)*np.log(2*np.pi)
 
 
     def jacnlml(self, lth):
@@ -105,25 +278,151 @@ class gaussianprocess:
         --
         lth: log of the hyperparameters
         """
-        x, y= self.x, self.y
-        k, L= self.kernelmatrix(lth, x)
-        # find derivatives of kernel matrix wrt hyperparameters
-        kjac= np.empty((len(x), len(x), len(lth)))
-        for i in range(len(x)):
-            kjac[i, :, :-1]= self.covfn(x[i], x, lth)[1]
-        if np.any(self.merrors):
-            kjac[:, :, -1]= np.diag(self.merrors)*np.exp(lth[-1])
+        if self.noiseonly(lth):
+            # use the eigenvalues of the kernel matrix, with W = a a^T - D^-1 in the basis of the eigenvectors
+            ec= self.eigendecompose(lth)
+            Q, kjac= ec['Q'], ec['kjac']
+            d= ec['lam'] + np.exp(lth[-1])
+            a= np.reshape(ec['Qy'], (len(d), -1))/d[:,None]
+            jac= np.empty(len(lth))
+            if ec['Mjac'] is None and ec['nojac'] > 0:
+                # the noise alone is changing repeatedly: transform the Jacobian of the kernel matrix so that later Jacobians cost O(N^2)
+                ec['Mjac']= np.array([np.dot(Q.T, np.dot(kjac[...,j], Q)) for j in range(kjac.shape[-1])])
+            ec['nojac'] += 1
+            if ec['Mjac'] is None:
+                Qa= np.dot(Q, a)
+                W= np.dot(Qa, Qa.T) - a.shape[1]*np.dot(Q/d, Q.T)
+                jac[:-1]= -0.5*np.dot(W.ravel(), kjac.reshape(-1, kjac.shape[-1]))
+            else:
+                jac[:-1]= [-0.5*(np.sum(a*np.dot(M, a)) - a.shape[1]*np.dot(np.diagonal(M), 1/d))
+                           for M in ec['Mjac']]
+            jac[-1]= -0.5*np.exp(lth[-1])*(np.sum(a**2) - a.shape[1]*np.sum(1/d))
+            return jac
+        fc= self.factorize(lth, jac= True)
+        L, al, kjac= fc['L'], fc['al'], fc['kjac']
+        # invert the kernel matrix directly from its Cholesky factor
+        Kinv, info= linalg.lapack.dpotri(L[0], lower= L[1])
+        if info != 0:
+            raise np.linalg.LinAlgError('Inversion of the kernel matrix failed')
+        if L[1]:
+            Kinv= np.tril(Kinv) + np.tril(Kinv, -1).T
+        else:
+            Kinv= np.triu(Kinv) + np.triu(Kinv, 1).T
+        al= np.reshape(al, (len(al), -1))
+        W= np.dot(al, al.T) - al.shape[1]*Kinv
+        # tr(W dK/dlth) for all hyperparameters at once; the noise term is diagonal
+        jac= np.empty(len(lth))
+        jac[:-1]= -0.5*np.dot(W.ravel(), kjac.reshape(-1, kjac.shape[-1]))
+        jac[-1]= -0.5*np.dot(np.diagonal(W), self.noisevariance(lth, len(al)))
+        return jac
+
+
+    def nlmljac(self, lth):
+        """
+        Returns the negative of the log marginal likelihood and its Jacobian from a single factorization of the kernel matrix.
+
+        Arguments
+        --
+        lth: log of the hyperparameters
+        """
+        if not self.noiseonly(lth):
+            # factorize with the Jacobian of the kernel matrix so that nlml and jacnlml both use this one factorization
+            self.factorize(lth, jac= True)
+        return self.nlml(lth), self.jacnlml(lth)
+
+
+    def profilenoise(self, lths):
+        """
+        Returns the log of the measurement noise that minimizes the negative log marginal likelihood given the other log hyperparameters.
+
+        For homoscedastic noise, the kernel matrix is decomposed into eigenvalues once so that each likelihood in the search costs O(N).
+
+        Arguments
+        --
+        lths: log of the hyperparameters except for the noise
+        """
+        from scipy.optimize import minimize_scalar
+        bn= np.array(self.b[-1])*np.log(10)
+        if self.eigennoise and not np.any(self.merrors):
+            self.eigendecompose(np.append(lths, bn[0]))
+        fn= lambda ln: self.nlml(np.append(lths, ln))
+        res= minimize_scalar(fn, bounds= bn, method= 'bounded', options= {'xatol': 1e-6})
+        # the search does not reach the bounds
+        return min([res.x, bn[0], bn[1]], key= fn)
+
+
+    def profilenlmljac(self, lths):
+        """
+        Returns the profile negative log marginal likelihood, minimized over the measurement noise, and its Jacobian with respect to the other log hyperparameters.
+
+        Arguments
+        --
+        lths: log of the hyperparameters except for the noise
+        """
+        lth= np.append(lths, self.profilenoise(lths))
+        nlml, jac= self.nlmljac(lth)
+        return nlml, jac[:-1]
+
+
+    def optimizationrun(self, runseed, stvals= False, optmethod= 'l_bfgs_b', optmessages= False, linalgmax= 3,
+                        profile= False):
+        """
+        Runs one attempt at optimizing the hyperparameters and returns the optimal log hyperparameters, the corresponding negative log marginal likelihood, and a flag equal to 1 if the optimization succeeded.
+
+        Arguments
+        --
+        runseed: seed for the random initial values of the hyperparameters
+        stvals: an (optional) initial guess for the log hyperparameters
+        optmethod: the optimization routine to be used, either 'l_bfgs_b' (default) or 'tnc'
+        optmessages: if True, display messages from the optimization routine
+        linalgmax: number of attempts (default is 3) if a linear algebra (numerical) error is generated
+        profile: if True, optimize the profile likelihood, with the noise optimized for each value of the other hyperparameters
+        """
+        # convert b into exponential base
+        b= np.array(self.b)*np.log(10)
+        if profile:
+            fn, bo= self.profilenlmljac, b[:-1]
         else:
-            kjac[:, :, -1]= np.identity(len(x))*np.exp(lth[-1])
-        # calculate jacobian
-        al= linalg.cho_solve(L, y)
-        alal= np.outer(al, al)
-        Kinv= linalg.cho_solve(L, np.identity(len(x)))
-        return np.asarray([-0.5*np.trace(np.dot(alal - Kinv, kjac[:,:,i])) for i in range(len(lth))])
+            fn, bo= self.nlmljac, b
+        rng= np.random.RandomState(runseed)
+        lthf, lmlml, success= np.nan*np.ones(len(b)), np.nan, 0
+        linalgerror= 0
+        while linalgerror < linalgmax:
+            try:
+                if np.any(stvals):
+                    # initial values given for hyperparameters
+                    lth= stvals
+                else:
+                    # choose random initial values for hyperparameters
+                    lth= [rng.uniform(b[j][0], b[j][1]) for j in range(len(b))]
+                lth= lth[:len(bo)]
+                # run Gaussian process
+                if optmethod == 'tnc':
+                    from scipy.optimize import fmin_tnc
+                    lthf, nf, success= fmin_tnc(fn, lth, bounds= bo,
+                                                maxfun= 1000, messages= optmessages)
+                    linalgerror= linalgmax
+                elif optmethod == 'l_bfgs_b':
+                    from scipy.optimize import fmin_l_bfgs_b
+                    lthf, lmlml, dout= fmin_l_bfgs_b(fn, lth, bounds= bo,
+                                                     disp= optmessages)
+                    linalgerror= linalgmax
+                    success= dout['warnflag'] + 1
+                else:
+                    raise gaussianprocessException(optmethod + ' unrecognized.')
+                if profile:
+                    lthf= np.append(lthf, self.profilenoise(lthf))
+                if optmethod == 'tnc':
+                    lmlml= self.nlml(lthf)
+            except np.linalg.LinAlgError:
+                print(' Warning: linear algebra error - trying a different initial condition')
+                linalgerror += 1
+        return lthf, lmlml, success
 
 
     def findhyperparameters(self, noruns= 1, exitearly= False, stvals= False, optmethod= 'l_bfgs_b',
-                            optmessages= False, quiet= True, linalgmax= 3):
+                            optmessages= False, quiet= True, linalgmax= 3, workers= 1, seed= None,
+                            hpcache= False, hpkey= False, profile= False):
         """
         Finds the best fit hyperparameters (.lth_opt) and the optimum value of negative log marginal likelihood (.nlml_opt).
 
@@ -136,47 +435,73 @@ class gaussianprocess:
         optmessages: if True, display messages from the optimization routine
         quiet: if True, print warning that if an optimum hyperparameter is at a bound
         linalgmax: number of attempts (default is 3) if a linear algebra (numerical) error is generated
+        workers: number of processes over which the runs are distributed (default is 1: all runs are made in this process)
+        seed: if specified, the seed from which the seeds of the individual runs are generated; otherwise these seeds are drawn from numpy's global random state
+        hpcache: if specified, a hyperparametercache whose optimum for hpkey, if any, is used to start the first run; if this run succeeds, only hpcache.extraruns further runs are made; the best-fit hyperparameters are stored in the cache
+        hpkey: a dictionary of metadata, such as {'carbon': 'glucose', 'temp': 37}, identifying data with similar hyperparameters (the class of Gaussian process is added automatically)
+        profile: if True, optimize the profile likelihood, in which the noise is optimized separately for each value of the other hyperparameters; this is only fast for homoscedastic noise with eigennoise set to True
         """
+        # kept so that addobservations re-optimizes in the same way
+        self._findargs= {'noruns': noruns, 'exitearly': exitearly, 'optmethod': optmethod,
+                         'optmessages': optmessages, 'quiet': quiet, 'linalgmax': linalgmax,
+                         'workers': workers, 'seed': seed, 'hpcache': hpcache, 'hpkey': hpkey,
+                         'profile': profile}
         b= self.b
         self.hparamerr= []
-        lmlml= np.empty(noruns)
-        lthf= np.empty((noruns, len(b)))
-        success= np.empty(noruns)
+        lmlml= np.nan*np.ones(noruns)
+        lthf= np.nan*np.ones((noruns, len(b)))
+        success= np.zeros(noruns)
         # convert b into exponential base
         b= np.array(b)*np.log(10)
+        # each run has its own seed so that results do not depend on how runs are distributed
+        if seed is None:
+            runseeds= np.random.randint(2**31 - 1, size= noruns)
+        else:
+            runseeds= np.random.RandomState(seed).randint(2**31 - 1, size= noruns)
+        runargs= (stvals, optmethod, optmessages, linalgmax, profile)
+        # first run from a cached optimum
+        firstrun= 0
+        if hpcache:
+            hpkey= dict(hpkey or {}, gp= self.__class__.__name__)
+            lthc= hpcache.get(hpkey)
+            if lthc is not None:
+                lthc= np.clip(lthc, b[:,0], b[:,1])
+                lthf[0,:], lmlml[0], success[0]= self.optimizationrun(runseeds[0], lthc, *runargs[1:])
+                firstrun= 1
+                if success[0] != 1 or np.any(np.isnan(lthf[0,:])):
+                    print(' Warning: optimization from cached hyperparameters failed')
+                    success[0]= 0
+                else:
+                    hpcache.converged += 1
+                    # fewer runs are needed
+                    noruns= 1 if exitearly else min(noruns, 1 + hpcache.extraruns)
+                    lmlml, lthf, success= lmlml[:noruns], lthf[:noruns], success[:noruns]
         # run optimization
-        for i in range(noruns):
-            linalgerror= 0
-            while linalgerror < linalgmax:
-                try:
-                    if np.any(stvals):
-                        # initial values given for hyperparameters
-                        lth= stvals
-                    else:
-                        # choose random initial values for hyperparameters
-                        lth= [np.random.uniform(b[j][0], b[j][1]) for j in range(len(b))]
-                    # run Gaussian process
-                    if optmethod == 'tnc':
-                        from scipy.optimize import fmin_tnc
-                        lthf[i,:], nf, success[i]= fmin_tnc(self.nlml, lth, fprime= self.jacnlml,
-                                                          bounds= b, maxfun= 1000, messages= optmessages)
-                        linalgerror= linalgmax
-                        lmlml[i]= self.nlml(lthf[i,:])
-                    elif optmethod == 'l_bfgs_b':
-                        from scipy.optimize import fmin_l_bfgs_b
-                        lthf[i,:], lmlml[i], dout= fmin_l_bfgs_b(self.nlml, lth, fprime= self.jacnlml,
-                                                                bounds= b, disp= optmessages)
-                        linalgerror= linalgmax
-                        success[i]= dout['warnflag'] + 1
-                    else:
-                        print(optmethod + ' unrecognized.')
-                except np.linalg.LinAlgError:
-                    print(' Warning: linear algebra error - trying a different initial condition')
-                    linalgerror += 1
-            if success[i] != 1 or np.any(np.isnan(lthf)):
-                print(' Warning: optimization failed at run ' + str(i+1))
-            else:
-                if exitearly: break
+        if workers > 1 and noruns - firstrun > 1:
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+            # avoid sending a cached factorization to each process
+            self._factorcache, self._eigcache= None, None
+            with ProcessPoolExecutor(max_workers= min(workers, noruns)) as pool:
+                futures= {pool.submit(self.optimizationrun, runseeds[i], *runargs): i
+                          for i in range(firstrun, noruns)}
+                for future in as_completed(futures):
+                    i= futures[future]
+                    lthf[i,:], lmlml[i], success[i]= future.result()
+                    if success[i] != 1 or np.any(np.isnan(lthf[i,:])):
+                        print(' Warning: optimization failed at run ' + str(i+1))
+                        success[i]= 0
+                    elif exitearly:
+                        # cancel the runs that have yet to start
+                        for f in futures: f.cancel()
+                        break
+        else:
+            for i in range(firstrun, noruns):
+                lthf[i,:], lmlml[i], success[i]= self.optimizationrun(runseeds[i], *runargs)
+                if success[i] != 1 or np.any(np.isnan(lthf[i,:])):
+                    print(' Warning: optimization failed at run ' + str(i+1))
+                    success[i]= 0
+                else:
+                    if exitearly: break
         # only process runs that did not converge
         if np.any(success == 1):
             lmlml= lmlml[success == 1]
@@ -196,8 +521,102 @@ class gaussianprocess:
                     else:
                         self.hparamerr.append([i, 'l'])
             self.lth_opt= lthb
+            if hpcache:
+                hpcache.put(hpkey, lthb)
+            # the cache holds the factorization from the last run, which need not be the best: factorize at the optimum, as predict and addobservations require
+            self.factorize(lthb)
+            # release the Jacobian of the kernel matrix kept for the optimizer
+            if self._factorcache is not None:
+                self._factorcache['kjac']= None
+            self._eigcache= None
         else:
             raise gaussianprocessException('Optimization of hyperparameters failed')
+        # for addobservations
+        self.noadded= 0
+        self._nlmlref= self.nlml_opt/np.size(self.y)
+
+
+    def addobservations(self, xnew, ynew, merrorsnew= False, reoptevery= False, drifttol= False):
+        """
+        Adds new data, such as the latest time points from a plate reader, to a Gaussian process whose hyperparameters have been found and returns True if the hyperparameters were re-optimized.
+
+        At fixed hyperparameters, the Cholesky factorization of the kernel matrix is extended with the new data at a cost of O(N^2 k) for k new points rather than being recalculated at a cost of O(N^3). The hyperparameters are re-optimized, starting from their current values and with the other options of the last call of findhyperparameters (such as noruns, optmethod, and hpcache), either when reoptevery points have been added since they were last optimized or when the negative log marginal likelihood per data point has changed by more than drifttol. Run predict() again to update predictions.
+
+        Arguments
+        --
+        xnew: a 1-d array of the new abscissa data
+        ynew: an array of the new ordinate data (with the same number of columns as y)
+        merrorsnew: the measurement errors (as variances) of the new data, required if merrors were specified
+        reoptevery: if specified, the number of added data points after which the hyperparameters are re-optimized
+        drifttol: if specified, the change in the negative log marginal likelihood per data point that triggers re-optimization of the hyperparameters
+        """
+        try:
+            lth= self.lth_opt
+        except AttributeError:
+            raise gaussianprocessException('Run findhyperparameters() first before adding data.')
+        xnew= np.atleast_1d(np.asarray(xnew, dtype= float))
+        ynew= np.asarray(ynew, dtype= float)
+        if np.ndim(self.y) == 1:
+            ynew= np.atleast_1d(ynew)
+        else:
+            ynew= np.reshape(ynew, (len(xnew), -1))
+        if np.any(self.merrors):
+            if not np.any(merrorsnew) or len(merrorsnew) != len(xnew):
+                raise gaussianprocessException('Each new data point requires a measurement error.')
+            self.merrors= np.concatenate((self.merrors, merrorsnew))
+        noold= len(self.x)
+        self._eigcache= None
+        self.x= np.concatenate((self.x, xnew))
+        self.y= np.concatenate((self.y, ynew))
+        self.updatefactorization(lth, noold)
+        self.noadded += len(xnew)
+        nlmlpp= self.nlml(lth)/np.size(self.y)
+        reopt= bool(reoptevery) and self.noadded >= reoptevery
+        if drifttol and abs(nlmlpp - self._nlmlref) > drifttol:
+            reopt= True
+        if reopt:
+            self.findhyperparameters(stvals= lth, **self._findargs)
+        else:
+            self.nlml_opt= nlmlpp*np.size(self.y)
+        return reopt
+
+
+    def updatefactorization(self, lth, noold):
+        """
+        Extends the cached factorization of the kernel matrix of the first noold data points at lth to all the data points using a block Cholesky update.
+
+        Arguments
+        --
+        lth: log of the hyperparameters
+        noold: number of data points in the cached factorization
+        """
+        lth= np.asarray(lth, dtype= float)
+        fc= self._factorcache
+        if fc is None or not np.array_equal(fc['lth'], lth) or len(fc['al']) != noold:
+            # no factorization to extend
+            self._factorcache= None
+            return
+        (L, lower), x= fc['L'], self.x
+        xo, xn= x[:noold], x[noold:]
+        kon= self.covmatrix(xo, xn, lth)[0]
+        knn= self.covmatrix(xn, xn, lth)[0]
+        knn[np.diag_indices_from(knn)] += self.noisevariance(lth, len(x))[noold:]
+        # with K_old = C C^T for lower triangular C, the new factor is [[C, 0], [S^T, D]]
+        S= linalg.solve_triangular(L, kon, lower= lower, trans= 'N' if lower else 'T')
+        D, jitter= self.cholesky(knn - np.dot(S.T, S), lower= True)
+        D= np.tril(D[0])
+        Lnew= np.zeros((len(x), len(x)))
+        if lower:
+            Lnew[:noold,:noold]= np.tril(L)
+            Lnew[noold:,:noold]= S.T
+            Lnew[noold:,noold:]= D
+        else:
+            Lnew[:noold,:noold]= np.triu(L)
+            Lnew[:noold,noold:]= S
+            Lnew[noold:,noold:]= D.T
+        Lnew= (Lnew, lower)
+        self._factorcache= {'lth': lth.copy(), 'L': Lnew, 'al': linalg.cho_solve(Lnew, self.y),
+                            'kjac': None, 'jitter': max(fc['jitter'], jitter)}
 
 
 
@@ -223,16 +642,28 @@ class gaussianprocess:
 
 
 
-    def sample(self, size= 1):
+    def sample(self, size= 1, rank= False):
         '''
         Generate samples from the Gaussian process as an array.
 
+        If y has more than one column, the samples are returned as an array of shape (predictions, columns, samples).
+
+        The factor of the covariance matrix is calculated once after each prediction (see samplefactor()) so that each call only requires a matrix multiplication.
+
         Arguments
         --
         size: number of samples
+        rank: if specified, sample using only this number of the largest eigenvalues of the covariance matrix, which is faster for many predictions
         '''
         try:
-            return np.transpose(np.random.multivariate_normal(self.mnp, self.covp, size))
+            A= self.samplefactor(rank)
+            if np.ndim(self.mnp) == 2:
+                # independent samples for each column from the shared covariance matrix
+                nocols= self.mnp.shape[1]
+                z= np.random.randn(A.shape[1], nocols*size)
+                return self.mnp[:,:,None] + np.reshape(np.dot(A, z), (len(A), nocols, size))
+            else:
+                return self.mnp[:,None] + np.dot(A, np.random.randn(A.shape[1], size))
         except AttributeError:
             print( ' Run gp.predict() first before sampling.')
 
@@ -266,6 +697,10 @@ class gaussianprocess:
         """
         Determines the predicted mean latent function (.f) and its variance (.fvar) and potentially the predicted mean first derivative (.df) and its variance (.dfvar) and the predicted mean second derivative (.ddf) and its variance (.ddfvar) . Also .mnp is the predicted combined array of the mean latent function and its mean derivatives and .covp is the corresponding covariance matrix.
 
+        Only the variances are calculated here; the full covariance matrix .covp is calculated when it is first used, such as by sample().
+
+        If y has more than one column, the means have one column for each data set and the variances, which do not depend on y, are shared.
+
         Arguments
         --
         xnew: abscissa values for which predicted ordinate values are desired
@@ -273,6 +708,7 @@ class gaussianprocess:
         derivs: if 0, only the latent function is inferred; if 1, the latent function and the first derivative are inferred; if 2, the latent function and the first and second derivatives are inferred
         addnoise: if True, add measuremnet noise to the predicted variance
         """
+        xnew= np.asarray(xnew)
         if len(self.x) == len(xnew) and (self.x == xnew).all():
             xold= True
         else:
@@ -288,50 +724,19 @@ class gaussianprocess:
             lth, x, y= self.lth_opt, self.x, self.y
             # work with an array of length 3*N: the first N values being the function,
             # the second N values being the first derivative, and the last N values being the second derivative
-            Knewold= np.empty((len(xnew), len(x)))
-            Knewnew= np.empty((len(xnew), len(xnew)))
-            if derivs > 0:
-                d1Knewold= np.empty((len(xnew), len(x)))
-                d1Knewnew= np.empty((len(xnew), len(xnew)))
-                d1d2Knewnew= np.empty((len(xnew), len(xnew)))
-            if derivs > 1:
-                d12Knewold= np.empty((len(xnew), len(x)))
-                d12Knewnew= np.empty((len(xnew), len(xnew)))
-                d12d2Knewnew= np.empty((len(xnew), len(xnew)))
-                d12d22Knewnew= np.empty((len(xnew), len(xnew)))
-            for i in range(len(xnew)):
-                Knewold[i,:]= self.covfn(xnew[i], x, lth)[0]
-                Knewnew[i,:]= self.covfn(xnew[i], xnew, lth)[0]
-                if derivs > 0:
-                    d1Knewold[i,:]= self.d1covfn(xnew[i], x, lth)[0]
-                    d1Knewnew[i,:]= self.d1covfn(xnew[i], xnew, lth)[0]
-                    d1d2Knewnew[i,:]= self.d1d2covfn(xnew[i], xnew, lth)[0]
-                if derivs > 1:
-                    d12Knewold[i,:]= self.d12covfn(xnew[i], x, lth)[0]
-                    d12Knewnew[i,:]= self.d12covfn(xnew[i], xnew, lth)[0]
-                    d12d2Knewnew[i,:]= self.d12d2covfn(xnew[i], xnew, lth)[0]
-                    d12d22Knewnew[i,:]= self.d12d22covfn(xnew[i], xnew, lth)[0]
-            if derivs == 0:
-                kv= Knewold
-                km= Knewnew
-            elif derivs == 1:
-                kv= np.bmat([[Knewold], [d1Knewold]])
-                km= np.bmat([[Knewnew, np.transpose(d1Knewnew)],
-                             [d1Knewnew, d1d2Knewnew]])
-            elif derivs == 2:
-                kv= np.bmat([[Knewold], [d1Knewold], [d12Knewold]])
-                km= np.bmat([[Knewnew, np.transpose(d1Knewnew), np.transpose(d12Knewnew)],
-                              [d1Knewnew, d1d2Knewnew, np.transpose(d12d2Knewnew)],
-                              [d12Knewnew, d12d2Knewnew, d12d22Knewnew]])
+            kv= np.concatenate(self.covfnblocks(xnew[:,None], x[None,:], lth, crossnames[:derivs+1]))
+            priorvar= self.covfnblocks(xnew, xnew, lth, priornames[:derivs+1])
             # find mean prediction
-            k, L= self.kernelmatrix(lth, x)
-            m= np.dot(kv, linalg.cho_solve(L, y))
-            mnp= np.reshape(np.array(m), np.size(m))
+            fc= self.factorize(lth)
+            L= fc['L']
+            mnp= np.dot(kv, fc['al'])
             self.mnp= mnp
-            # find variance of prediction
-            covp= km - np.dot(kv, linalg.cho_solve(L, np.transpose(kv)))
-            self.covp= covp
-            varp= np.diag(covp)
+            # find variance of prediction from W with W^T W = kv K^-1 kv^T
+            W= linalg.solve_triangular(L[0], kv.T, lower= L[1], trans= 'N' if L[1] else 'T',
+                                       overwrite_b= True)
+            varp= np.concatenate(priorvar) - np.sum(W**2, 0)
+            # store what is needed for the full covariance matrix
+            self._predcov= {'W': W, 'xnew': xnew, 'lth': lth, 'derivs': derivs, 'covp': None}
             # for user
             self.f= mnp[:len(xnew)]
             self.fvar= varp[:len(xnew)]
@@ -340,11 +745,11 @@ class gaussianprocess:
                 # add measurement error to the variance of the latent function
                 if np.any(self.merrors):
                     if xold:
-                        self.fvar= fvar + np.exp(lth[-1])*np.diag(self.merrors)
+                        self.fvar= fvar + np.exp(lth[-1])*self.merrors
                     else:
                         self.fvar= fvar + merrorsnew
                 else:
-                    self.fvar= fvar + np.exp(lth[-1])*np.identity(len(xnew))
+                    self.fvar= fvar + np.exp(lth[-1])
             else:
                 # just take the variance of the latent function
                 self.fvar= fvar
@@ -356,6 +761,113 @@ class gaussianprocess:
                 self.ddfvar= varp[2*len(xnew):]
 
 
+    @property
+    def covp(self):
+        """
+        The covariance matrix of the latent function and its derivatives predicted at .xnew, which is calculated from the results of predict() when first needed.
+        """
+        pc= self._predcov
+        if pc is None:
+            raise AttributeError('covp')
+        if pc['covp'] is None:
+            xnew, lth, derivs= pc['xnew'], pc['lth'], pc['derivs']
+            names= ['covfn', 'd1covfn', 'd1d2covfn', 'd12covfn', 'd12d2covfn', 'd12d22covfn']
+            blocks= self.covfnblocks(xnew[:,None], xnew[None,:], lth, names[:[1, 3, 6][derivs]])
+            if derivs == 0:
+                km= blocks[0]
+            elif derivs == 1:
+                Knewnew, d1Knewnew, d1d2Knewnew= blocks
+                km= np.block([[Knewnew, d1Knewnew.T],
+                              [d1Knewnew, d1d2Knewnew]])
+            elif derivs == 2:
+                Knewnew, d1Knewnew, d1d2Knewnew, d12Knewnew, d12d2Knewnew, d12d22Knewnew= blocks
+                km= np.block([[Knewnew, d1Knewnew.T, d12Knewnew.T],
+                              [d1Knewnew, d1d2Knewnew, d12d2Knewnew.T],
+                              [d12Knewnew, d12d2Knewnew, d12d22Knewnew]])
+            km -= np.dot(pc['W'].T, pc['W'])
+            pc['covp']= km
+        return pc['covp']
+
+
+    def samplefactor(self, rank= False, jitter= 1e-10, maxjitter= 1e-4):
+        '''
+        Returns a matrix A with A A^T equal to the predicted covariance matrix .covp, which is cached until the next prediction.
+
+        A is the Cholesky factor of .covp with its diagonal increased by a relative jitter, which is raised by factors of ten from jitter to maxjitter until the factorization succeeds; if it still fails, a square root is found from the eigenvalues. If rank is specified, A has only rank columns, from the largest eigenvalues and eigenvectors of the correlation matrix corresponding to .covp.
+
+        Arguments
+        --
+        rank: if specified, the number of eigenvalues retained
+        jitter: initial jitter added to the diagonal relative to the diagonal
+        maxjitter: maximum jitter
+        '''
+        covp= self.covp
+        factors= self._predcov.setdefault('factors', {})
+        if rank not in factors:
+            n= len(covp)
+            if rank and rank < n:
+                # use the correlation matrix so that the derivatives, with their smaller variances, are not neglected
+                sd= np.sqrt(np.maximum(np.diagonal(covp), 0))
+                sd[sd == 0]= 1
+                w, v= linalg.eigh(covp/np.outer(sd, sd), subset_by_index= [n - rank, n - 1])
+                A= sd[:,None]*v*np.sqrt(np.maximum(w, 0))
+            else:
+                A= None
+                d= np.diagonal(covp)
+                while A is None and jitter <= maxjitter:
+                    try:
+                        A= linalg.cholesky(covp + np.diag(jitter*d), lower= True)
+                    except np.linalg.LinAlgError:
+                        jitter *= 10
+                if A is None:
+                    A= symsqrt(covp)
+            factors[rank]= A
+        return factors[rank]
+
+
+
+
+    def predictmarginal(self, xnew, derivs= 0, chunksize= 1024):
+        '''
+        Returns the predicted means and variances of the latent function and, depending on derivs, its first and second derivatives at xnew, with the latent function in the first row, the first derivative in the second row, and the second derivative in the third row.
+
+        Predictions are made in blocks of chunksize values of xnew so that the memory needed is bounded, which allows predictions on fine grids. Unlike predict(), no attributes are set and the covariances between predictions are not found.
+
+        Arguments
+        --
+        xnew: abscissa values for which predicted ordinate values are desired
+        derivs: if 0, only the latent function is inferred; if 1, the latent function and the first derivative are inferred; if 2, the latent function and the first and second derivatives are inferred
+        chunksize: the number of values of xnew predicted at once
+        '''
+        if not hasattr(self, 'lth_opt'):
+            raise gaussianprocessException(' Run gp.findhyperparameters() first before making predictions.')
+        xnew= np.asarray(xnew, dtype= float)
+        mn= np.empty((derivs+1, len(xnew)) + np.shape(self.y)[1:])
+        var= np.empty((derivs+1, len(xnew)))
+        for i in range(0, len(xnew), chunksize):
+            mn[:,i:i+chunksize], var[:,i:i+chunksize]= self.predictblock(xnew[i:i+chunksize], derivs)
+        return mn, var
+
+
+    def predictblock(self, xnew, derivs= 0):
+        '''
+        Returns the predicted means and variances of the latent function and its derivatives for a block of xnew (see predictmarginal()).
+
+        Arguments
+        --
+        xnew: a 1-d array of abscissa values
+        derivs: the number of derivatives inferred
+        '''
+        lth, x= self.lth_opt, self.x
+        fc= self.factorize(lth)
+        L= fc['L']
+        kv= self.covfnblocks(xnew[:,None], x[None,:], lth, crossnames[:derivs+1])
+        priorvar= self.covfnblocks(xnew, xnew, lth, priornames[:derivs+1])
+        mn= [np.dot(k, fc['al']) for k in kv]
+        var= [pv - np.sum(linalg.solve_triangular(L[0], k.T, lower= L[1], trans= 'N' if L[1] else 'T',
+                                                  overwrite_b= True)**2, 0)
+              for k, pv in zip(kv, priorvar)]
+        return mn, var
 
 
     def sketch(self, datasymbol= 'o', GPcolor= 'blue', nostds= 2):
@@ -398,10 +910,11 @@ class lnGP(gaussianprocess):
         lth: the log of the hyperparameters
         '''
         th= np.exp(lth)
-        k= th[0] + th[1]*x*xp
-        jk= np.empty((len(xp), self.noparams))
-        jk[:,0]= th[0]*np.ones(len(xp))
-        jk[:,1]= th[1]*x*xp
+        xxp= x*xp
+        k= th[0] + th[1]*xxp
+        jk= np.empty(np.shape(k) + (self.noparams,))
+        jk[...,0]= th[0]
+        jk[...,1]= th[1]*xxp
         return k, jk
 
     def gradcovfn(self, x, xp, lth):
@@ -457,16 +970,19 @@ class nnGP(gaussianprocess):
         lth: the log of the hyperparameters
         """
         th= np.exp(lth)
-        k= (np.arcsin(2*(th[0] + x*xp*th[1])/np.sqrt(1+2*(th[0]+x**2*th[1]))
-                      /np.sqrt(1+2*(th[0]+xp**2*th[1]))))*2/np.pi
-        jk= np.empty((len(xp), self.noparams))
-        den= np.pi*(1+2*th[0]+2*th[1]*x**2)*(1+2*th[0]+2*th[1]*xp**2) \
-          *np.sqrt(1+4*th[0]*(1+th[1]*(x-xp)**2)+2*th[1]*(x**2+xp**2))
-        jk[:,0]= (4*(1+2*th[0]*(1+th[1]*(x-xp)**2) - 2*th[1]**2*x*(x-xp)**2*xp \
-                     + 2*th[1]*(x**2-x*xp+xp**2)))/den*th[0]
-        jk[:,1]= -(4*(2*th[0]**2*(x-xp)**2 - x*xp*(1+th[1]*(x**2+xp**2)) \
-                      + th[0]*(-2*th[1]*x**3*xp+xp**2-2*x*xp*(2+th[1]*xp**2) \
-                               +x**2*(1+4*th[1]*xp**2))))/den*th[1]
+        # terms shared by the kernel and its Jacobian
+        x2, xp2, xxp= x**2, xp**2, x*xp
+        d2= (x-xp)**2
+        k= (np.arcsin(2*(th[0] + xxp*th[1])/np.sqrt(1+2*(th[0]+x2*th[1]))
+                      /np.sqrt(1+2*(th[0]+xp2*th[1]))))*2/np.pi
+        jk= np.empty(np.shape(k) + (self.noparams,))
+        den= np.pi*(1+2*th[0]+2*th[1]*x2)*(1+2*th[0]+2*th[1]*xp2) \
+          *np.sqrt(1+4*th[0]*(1+th[1]*d2)+2*th[1]*(x2+xp2))
+        jk[...,0]= (4*(1+2*th[0]*(1+th[1]*d2) - 2*th[1]**2*xxp*d2 \
+                     + 2*th[1]*(x2-xxp+xp2)))/den*th[0]
+        jk[...,1]= -(4*(2*th[0]**2*d2 - xxp*(1+th[1]*(x2+xp2)) \
+                      + th[0]*(-2*th[1]*x2*xxp+xp2-2*xxp*(2+th[1]*xp2) \
+                               +x2*(1+4*th[1]*xp2))))/den*th[1]
         return k, jk
 
     def d1covfn(self, x, xp, lth):
@@ -565,14 +1081,37 @@ class sqexpGP(gaussianprocess):
         lth: the log of the hyperparameters
         '''
         th= np.exp(lth)
-        xp= np.array(xp)
-        e= np.exp(-th[1]/2.0*(x-xp)**2)
+        d2= (x-np.asarray(xp))**2
+        e= np.exp(-th[1]/2.0*d2)
         k= th[0]*e
-        jk= np.empty((len(xp), self.noparams))
-        jk[:,0]= e*th[0]
-        jk[:,1]= -th[0]*th[1]*e/2.0*(x-xp)**2
+        jk= np.empty(np.shape(k) + (self.noparams,))
+        jk[...,0]= k
+        jk[...,1]= -th[1]/2.0*d2*k
         return k, jk
 
+    def covfnblocks(self, x, xp, lth, names):
+        '''
+        Returns a list of the covariance function and its derivatives named in names, such as ['covfn', 'd1covfn', 'd12covfn'], with the distances between x and xp calculated once.
+
+        Arguments
+        --
+        x: an array of abscissa
+        xp: an array of alternative abscissa (broadcast against x)
+        lth: the log of the hyperparameters
+        names: the names of the methods for the covariance function and its derivatives
+        '''
+        th= np.exp(lth)
+        d= x - np.asarray(xp)
+        d2= d**2
+        k= th[0]*np.exp(-th[1]/2.0*d2)
+        blocks= {'covfn': lambda: k,
+                 'd1covfn': lambda: -k*th[1]*d,
+                 'd1d2covfn': lambda: k*th[1]*(1 - th[1]*d2),
+                 'd12covfn': lambda: k*th[1]*(-1 + th[1]*d2),
+                 'd12d2covfn': lambda: k*th[1]**2*(-3 + th[1]*d2)*d,
+                 'd12d22covfn': lambda: k*th[1]**2*(3 - 6*th[1]*d2 + th[1]**2*d2**2)}
+        return [blocks[name]() for name in names]
+
     def d1covfn(self, x, xp, lth):
         '''
         Returns d/dx of the covariance function.
@@ -678,16 +1217,43 @@ class sqexplinGP(gaussianprocess):
         lth: the log of the hyperparameters
         '''
         th= np.exp(lth)
-        xp= np.array(xp)
-        e= np.exp(-th[1]/2.0*(x-xp)**2)
-        k= th[0]*e + th[2]*x*xp
-        jk= np.empty((len(xp), self.noparams))
-        jk[:,0]= e*th[0]
-        jk[:,1]= -th[0]*th[1]*e/2.0*(x-xp)**2
-        jk[:,2]= x*xp*th[2]
+        xp= np.asarray(xp)
+        d2= (x-xp)**2
+        e= th[0]*np.exp(-th[1]/2.0*d2)
+        xxp= th[2]*x*xp
+        k= e + xxp
+        jk= np.empty(np.shape(k) + (self.noparams,))
+        jk[...,0]= e
+        jk[...,1]= -th[1]/2.0*d2*e
+        jk[...,2]= xxp
         return k, jk
 
 
+    def covfnblocks(self, x, xp, lth, names):
+        '''
+        Returns a list of the covariance function and its derivatives named in names, such as ['covfn', 'd1covfn', 'd12covfn'], with the distances between x and xp calculated once.
+
+        Arguments
+        --
+        x: an array of abscissa
+        xp: an array of alternative abscissa (broadcast against x)
+        lth: the log of the hyperparameters
+        names: the names of the methods for the covariance function and its derivatives
+        '''
+        th= np.exp(lth)
+        xp= np.asarray(xp)
+        d= x - xp
+        d2= d**2
+        k= th[0]*np.exp(-th[1]/2.0*d2)
+        blocks= {'covfn': lambda: k + th[2]*x*xp,
+                 'd1covfn': lambda: -k*th[1]*d + th[2]*xp,
+                 'd1d2covfn': lambda: k*th[1]*(1 - th[1]*d2) + th[2],
+                 'd12covfn': lambda: k*th[1]*(-1 + th[1]*d2),
+                 'd12d2covfn': lambda: k*th[1]**2*(-3 + th[1]*d2)*d,
+                 'd12d22covfn': lambda: k*th[1]**2*(3 - 6*th[1]*d2 + th[1]**2*d2**2)}
+        return [blocks[name]() for name in names]
+
+
     def d1covfn(self, x, xp, lth):
         '''
         Returns d/dx of the covariance function.
@@ -793,17 +1359,43 @@ class maternGP(gaussianprocess):
         lth: the log of the hyperparameters
         '''
         th= np.exp(lth)
-        xp= np.asarray(xp)
-        r= np.abs(x - xp)
+        r= np.abs(x - np.asarray(xp))
         s5= np.sqrt(5)
-        e= np.exp(-s5*r/th[1])
-        poly= 1 + 5*r**2/3/th[1]**2 + s5*r/th[1]
-        k= th[0]*e*poly
-        jk= np.empty((len(xp), self.noparams))
-        jk[:,0]= e*poly
-        jk[:,1]= 5*e*th[0]*r**2*(th[1] + s5*r)/3/th[1]**4
+        u= s5*r/th[1]
+        e= np.exp(-u)
+        ep= e*(1 + u + u**2/3)
+        k= th[0]*ep
+        jk= np.empty(np.shape(k) + (self.noparams,))
+        jk[...,0]= k
+        jk[...,1]= th[0]*e*u**2*(1 + u)/3
         return k, jk
 
+    def covfnblocks(self, x, xp, lth, names):
+        '''
+        Returns a list of the covariance function and its derivatives named in names, such as ['covfn', 'd1covfn', 'd12covfn'], with the distances between x and xp calculated once.
+
+        Arguments
+        --
+        x: an array of abscissa
+        xp: an array of alternative abscissa (broadcast against x)
+        lth: the log of the hyperparameters
+        names: the names of the methods for the covariance function and its derivatives
+        '''
+        th= np.exp(lth)
+        d= x - np.asarray(xp)
+        r= np.abs(d)
+        s5= np.sqrt(5)
+        u= s5*r/th[1]
+        e= th[0]*np.exp(-u)
+        sns= np.where(d > 0, -1.0, 1.0)
+        blocks= {'covfn': lambda: e*(1 + u + u**2/3),
+                 'd1covfn': lambda: sns*5*e*r*(th[1] + s5*r)/3/th[1]**3,
+                 'd1d2covfn': lambda: 5*e*(th[1]**2 + s5*th[1]*r - 5*r**2)/3/th[1]**4,
+                 'd12covfn': lambda: -5*e*(th[1]**2 + s5*th[1]*r - 5*r**2)/3/th[1]**4,
+                 'd12d2covfn': lambda: sns*25*e*r*(3*th[1] - s5*r)/3/th[1]**5,
+                 'd12d22covfn': lambda: 25*e*(3*th[1]**2 + 5*r**2 - 5*s5*th[1]*r)/3/th[1]**6}
+        return [blocks[name]() for name in names]
+
     def d1covfn(self, x, xp, lth):
         '''
         Returns d/dx of the covariance function.
@@ -819,8 +1411,7 @@ class maternGP(gaussianprocess):
         s5= np.sqrt(5)
         e= np.exp(-s5*r/th[1])
         df= 5*e*th[0]*r*(th[1] + s5*r)/3/th[1]**3
-        sns= np.ones(np.size(xp))
-        sns[x > xp]= -1
+        sns= np.where(x > xp, -1.0, 1.0)
         return sns*df, False
 
     def d1d2covfn(self, x, xp, lth):
@@ -870,8 +1461,7 @@ class maternGP(gaussianprocess):
         s5= np.sqrt(5)
         e= np.exp(-s5*r/th[1])
         df= 25*e*th[0]*r*(3*th[1] - s5*r)/3/th[1]**5
-        sns= np.ones(np.size(xp))
-        sns[x > xp]= -1
+        sns= np.where(x > xp, -1.0, 1.0)
         return sns*df, False
 
     def d12d22covfn(self, x, xp, lth):
@@ -892,6 +1482,723 @@ class maternGP(gaussianprocess):
 
 
 
+####
+
+class sparsegaussianprocess(gaussianprocess):
+    '''
+    Sparse approximation to a Gaussian process using M inducing points spaced evenly over the range of the data, following Titsias (2009) for the variational ('vfe') approximation and Snelson and Ghahramani (2006) for the 'fitc' approximation.
+
+    Finding the hyperparameters and making predictions cost O(N M^2) rather than O(N^3). The sparse classes inherit their covariance functions from the corresponding dense classes, e.g.
+
+    g= gp.sparsesqexpGP({0: (-5,5), 1: (-6,2), 2: (-5,2)}, x, y, noinducing= 100)
+    '''
+    noinducing= 100
+    approx= 'vfe'
+    eigennoise= False
+    # relative size of the diagonal jitter added to the covariance of the inducing points
+    jitter= 1e-8
+
+    def __init__(self, lthbounds, x, y, merrors= False, noinducing= False, approx= False):
+        '''
+        Creates a sparse Gaussian process.
+
+        Arguments
+        --
+        lthbounds: a dictionary of pairs of the bounds on the hyperparameters in log10 space,
+        such as {0: [0,6], 1: [-3,4], 2: [-6,-4]}
+        x: a 1-d array of the abscissa data
+        y: a 1-d array of the ordinate data
+        merrors: if specified, a 1-d array of the measurement errors (as variances)
+        noinducing: number of inducing points (default is 100 or the number of distinct x if smaller)
+        approx: either 'vfe' (variational free energy: default) or 'fitc' (fully independent training conditional)
+        '''
+        gaussianprocess.__init__(self, lthbounds, x, y, merrors= merrors)
+        if noinducing: self.noinducing= noinducing
+        if approx: self.approx= approx
+        if self.approx not in ['vfe', 'fitc']:
+            raise gaussianprocessException(str(self.approx) + ' is not a recognized sparse approximation.')
+        self.noinducing= min(self.noinducing, len(np.unique(x)))
+        self.xu= np.linspace(np.min(x), np.max(x), self.noinducing)
+
+
+    def factorize(self, lth, jac= False):
+        """
+        Returns a dictionary with the lower Cholesky factors of the covariance matrix of the inducing points, Kuu = Lu Lu^T ('Lu'), and of B = I + Lu^-1 Kuf Lambda^-1 Kfu Lu^-T ('LB'), the weights of the inducing points beta = Kuu^-1 E[u] ('beta'), the negative log marginal likelihood ('nlml'), and, if jac is True, its Jacobian ('jac').
+
+        All calculations are made in the whitened basis of the inducing points for numerical stability. The results are cached for the most recent lth.
+
+        Arguments
+        --
+        lth: log of the hyperparameters
+        jac: if True, the Jacobian of the negative log marginal likelihood is also calculated
+        """
+        lth= np.asarray(lth, dtype= float)
+        fc= self._factorcache
+        if fc is not None and np.array_equal(fc['lth'], lth) and (fc['jac'] is not None or not jac):
+            return fc
+        x, y, xu= self.x, self.y, self.xu
+        M= len(xu)
+        kuu, dkuu= self.covmatrix(xu, xu, lth)
+        kfu, dkfu= self.covmatrix(x, xu, lth)
+        kff, dkff= self.covfn(x, x, lth)
+        # jitter proportional to the prior variance (and its derivative)
+        ijit= np.diag_indices_from(kuu)
+        kuu[ijit] += self.jitter*np.mean(np.diagonal(kuu))
+        dkuu[ijit] += self.jitter*np.mean(np.diagonal(dkuu), 1)
+        Lu= linalg.cholesky(kuu, lower= True)
+        Vw= linalg.solve_triangular(Lu, kfu.T, lower= True)
+        q= np.sum(Vw**2, 0)
+        noise= self.noisevariance(lth, len(x))
+        if self.approx == 'fitc':
+            s= kff - q + noise
+        else:
+            s= noise
+        ys= y/s
+        LB= linalg.cholesky(np.identity(M) + np.dot(Vw/s, Vw.T), lower= True)
+        cw= linalg.solve_triangular(LB, np.dot(Vw, ys), lower= True)
+        bhat= linalg.solve_triangular(LB, cw, lower= True, trans= 'T')
+        nlml= 0.5*(np.dot(y, ys) - np.dot(cw, cw)) + np.sum(np.log(np.diagonal(LB))) \
+            + 0.5*np.sum(np.log(s)) + 0.5*len(y)*np.log(2*np.pi)
+        if self.approx == 'vfe':
+            nlml += 0.5*np.sum((kff - q)/s)
+        fc= {'lth': lth.copy(), 'Lu': Lu, 'LB': LB, 'nlml': nlml, 'jac': None, 'kjac': None,
+             'beta': linalg.solve_triangular(Lu, bhat, lower= True, trans= 'T')}
+        if jac:
+            p= dkuu.shape[-1]
+            # whitened derivatives of the kernel matrices: Lu^-1 dKuf and Lu^-1 dKuu Lu^-T
+            G= linalg.solve_triangular(Lu, dkfu.transpose(1,0,2).reshape(M, -1),
+                                       lower= True).reshape(M, len(x), p)
+            H= linalg.solve_triangular(Lu, dkuu.reshape(M, -1), lower= True).reshape(M, M, p)
+            H= linalg.solve_triangular(Lu, H.transpose(1,0,2).reshape(M, -1),
+                                       lower= True).reshape(M, M, p)
+            BiVw= linalg.cho_solve((LB, True), Vw)
+            Biminus= linalg.cho_solve((LB, True), np.identity(M)) - np.identity(M)
+            # derivatives of q
+            dq= 2*np.einsum('mnj,mn->nj', G, Vw) - np.einsum('mn,mkj,kn->nj', Vw, H, Vw)
+            # derivatives of s with respect to the log hyperparameters with the noise last
+            ds= np.zeros((len(x), len(lth)))
+            if self.approx == 'fitc':
+                ds[:,:-1]= dkff - dq
+            ds[:,-1]= noise
+            u= np.dot(Vw.T, bhat)
+            # terms from the derivatives of the kernel matrices
+            Gbhat= np.einsum('mnj,m->nj', G, bhat)
+            dk= -2*np.dot(ys, Gbhat) + np.einsum('m,mkj,k->j', bhat, H, bhat) + 2*np.dot(u/s, Gbhat) \
+                + np.einsum('mk,mkj->j', Biminus, H) + 2*np.einsum('mnj,mn->j', G, BiVw/s)
+            # terms from the derivatives of s
+            dsterm= -ys**2 + 2*np.dot(bhat, Vw)*ys/s - u**2/s**2 - np.sum(Vw*BiVw, 0)/s**2 + 1/s
+            jacnlml= 0.5*np.dot(dsterm, ds)
+            jacnlml[:-1] += 0.5*dk
+            if self.approx == 'vfe':
+                jacnlml[:-1] += 0.5*np.dot(1/s, dkff - dq)
+                jacnlml -= 0.5*np.dot((kff - q)/s**2, ds)
+            fc['jac']= jacnlml
+        self._factorcache= fc
+        return fc
+
+
+    def updatefactorization(self, lth, noold):
+        """
+        Spreads the inducing points over the range of the data after data have been added and discards the cached factorization, which costs only O(N M^2) to recalculate.
+
+        Arguments
+        --
+        lth: log of the hyperparameters
+        noold: number of data points before data were added
+        """
+        self.xu= np.linspace(np.min(self.x), np.max(self.x), self.noinducing)
+        self._factorcache= None
+
+
+    def nlml(self, lth):
+        """
+        Returns the negative of the approximate log marginal likelihood.
+
+        Arguments
+        --
+        lth: log of the hyperparameters
+        """
+        return self.factorize(lth)['nlml']
+
+
+    def jacnlml(self, lth):
+        """
+        Returns the Jacobian of the negative of the approximate log marginal likelihood with respect to the log hyperparameters.
+
+        Arguments
+        --
+        lth: log of the hyperparameters
+        """
+        return self.factorize(lth, jac= True)['jac']
+
+
+    def nlmljac(self, lth):
+        """
+        Returns the negative of the approximate log marginal likelihood and its Jacobian from a single factorization.
+
+        Arguments
+        --
+        lth: log of the hyperparameters
+        """
+        fc= self.factorize(lth, jac= True)
+        return fc['nlml'], fc['jac']
+
+
+    def sample(self, size= 1, rank= False):
+        '''
+        Generate samples from the Gaussian process as an array.
+
+        Samples are projected from the posterior of the inducing points and so ignore the (typically small) variance of the latent function not captured by the inducing points.
+
+        Arguments
+        --
+        size: number of samples
+        rank: ignored (the samples already have the rank of the number of inducing points); accepted so that all Gaussian processes can be sampled alike
+        '''
+        try:
+            kv= self.kvsparse
+        except AttributeError:
+            print( ' Run gp.predict() first before sampling.')
+            return
+        fc= self.factorize(self.lth_opt)
+        # weights of the inducing points are distributed as N(beta, Lu^-T B^-1 Lu^-1)
+        w= linalg.solve_triangular(fc['LB'], np.random.randn(len(self.xu), size), lower= True, trans= 'T')
+        w= linalg.solve_triangular(fc['Lu'], w, lower= True, trans= 'T')
+        return self.mnp[:,None] + np.dot(kv, w)
+
+
+    def predict(self, xnew, merrorsnew= False, derivs= 0, addnoise= False):
+        """
+        Determines the predicted mean latent function (.f) and its variance (.fvar) and potentially the predicted mean first derivative (.df) and its variance (.dfvar) and the predicted mean second derivative (.ddf) and its variance (.ddfvar). Also .mnp is the predicted combined array of the mean latent function and its mean derivatives.
+
+        Only the variances are calculated and not the full covariance matrix.
+
+        Arguments
+        --
+        xnew: abscissa values for which predicted ordinate values are desired
+        merrorsnew: if specified, the expected measurements errors at xnew (need not be specified if xnew= x)
+        derivs: if 0, only the latent function is inferred; if 1, the latent function and the first derivative are inferred; if 2, the latent function and the first and second derivatives are inferred
+        addnoise: if True, add measuremnet noise to the predicted variance
+        """
+        xnew= np.asarray(xnew)
+        xold= len(self.x) == len(xnew) and (self.x == xnew).all()
+        if np.any(self.merrors) and not np.any(merrorsnew) and not xold:
+            print('Length of xnew is different from x.')
+            raise gaussianprocessException('Measurement errors were used to find the hyperparameters and measurement errors are therefore required for any predictions.')
+        elif not hasattr(self, 'lth_opt'):
+            raise gaussianprocessException(' Run gp.findhyperparameters() first before making predictions.')
+        self.xnew= xnew
+        lth, xu= self.lth_opt, self.xu
+        # covariances with the inducing points and prior variances for f, df, and ddf
+        kv= np.concatenate(self.covfnblocks(xnew[:,None], xu[None,:], lth, crossnames[:derivs+1]))
+        priorvar= self.covfnblocks(xnew, xnew, lth, priornames[:derivs+1])
+        fc= self.factorize(lth)
+        mnp= np.dot(kv, fc['beta'])
+        kvw= linalg.solve_triangular(fc['Lu'], kv.T, lower= True)
+        varp= np.concatenate(priorvar) - np.sum(kvw**2, 0) \
+            + np.sum(linalg.solve_triangular(fc['LB'], kvw, lower= True)**2, 0)
+        self.kvsparse= kv
+        self.mnp= mnp
+        # for user
+        n= len(xnew)
+        self.f= mnp[:n]
+        self.fvar= varp[:n]
+        if addnoise:
+            # add measurement error to the variance of the latent function
+            if np.any(self.merrors):
+                self.fvar= self.fvar + (np.exp(lth[-1])*self.merrors if xold else merrorsnew)
+            else:
+                self.fvar= self.fvar + np.exp(lth[-1])
+        if derivs > 0:
+            self.df= mnp[n:2*n]
+            self.dfvar= varp[n:2*n]
+        if derivs > 1:
+            self.ddf= mnp[2*n:]
+            self.ddfvar= varp[2*n:]
+
+
+    def predictblock(self, xnew, derivs= 0):
+        '''
+        Returns the predicted means and variances of the latent function and its derivatives for a block of xnew (see predictmarginal()).
+
+        Arguments
+        --
+        xnew: a 1-d array of abscissa values
+        derivs: the number of derivatives inferred
+        '''
+        lth, xu= self.lth_opt, self.xu
+        fc= self.factorize(lth)
+        kv= self.covfnblocks(xnew[:,None], xu[None,:], lth, crossnames[:derivs+1])
+        priorvar= self.covfnblocks(xnew, xnew, lth, priornames[:derivs+1])
+        mn= [np.dot(k, fc['beta']) for k in kv]
+        var= []
+        for k, pv in zip(kv, priorvar):
+            kvw= linalg.solve_triangular(fc['Lu'], k.T, lower= True)
+            var.append(pv - np.sum(kvw**2, 0)
+                       + np.sum(linalg.solve_triangular(fc['LB'], kvw, lower= True)**2, 0))
+        return mn, var
+
+
+class sparsennGP(sparsegaussianprocess, nnGP):
+    '''
+    Sparse Gaussian process with a neural network covariance function.
+    '''
+    description= 'sparse neural network Gaussian process'
+
+
+class sparsesqexpGP(sparsegaussianprocess, sqexpGP):
+    '''
+    Sparse Gaussian process with a squared exponential covariance function.
+    '''
+    description= 'sparse squared exponential Gaussian process'
+
+
+class sparsesqexplinGP(sparsegaussianprocess, sqexplinGP):
+    '''
+    Sparse Gaussian process with a squared exponential covariance function with a linear trend.
+    '''
+    description= 'sparse squared exponential Gaussian process with a linear trend'
+
+
+class sparsematernGP(sparsegaussianprocess, maternGP):
+    '''
+    Sparse Gaussian process with a Matern covariance function that is twice differentiable.
+    '''
+    description= 'sparse (twice differentiable) Matern covariance function'
+
+
+####
+
+class maternssGP(maternGP):
+    '''
+    Gaussian process with a Matern covariance function that is twice differentiable, solved as a linear stochastic differential equation (Hartikainen and Sarkka, 2010).
+
+    The latent function and its first two derivatives form the state of the equation, and fitting and predicting use a Kalman filter and a Rauch-Tung-Striebel smoother, which cost O(N) rather than O(N^3). Results are the same as those of maternGP.
+    '''
+    description= '(twice differentiable) Matern covariance function in state-space form'
+    eigennoise= False
+
+    def statespace(self, lth, dt, jac= False):
+        '''
+        Returns the stationary covariance of the state (f, df, ddf) and the transition matrices and process noise covariances for the time steps dt and, if jac is True, their derivatives with respect to the log hyperparameters of the covariance function (in the first axis for the stationary covariance and in the second axis for the others).
+
+        Arguments
+        --
+        lth: the log of the hyperparameters
+        dt: a 1-d array of (non-negative) time steps
+        jac: if True, also return the derivatives
+        '''
+        th= np.exp(lth)
+        lam= np.sqrt(5)/th[1]
+        Pinf= th[0]*np.array([[1, 0, -lam**2/3], [0, lam**2/3, 0], [-lam**2/3, 0, lam**4]])
+        # F + lam I is nilpotent so that expm(F dt) has a closed form
+        Nf= np.array([[lam, 1, 0], [0, lam, 1], [-lam**3, -3*lam**2, -2*lam]])
+        dt= np.asarray(dt)[:,None,None]
+        ed= np.exp(-lam*dt)
+        A= ed*(np.identity(3) + Nf*dt + np.dot(Nf, Nf)*dt**2/2)
+        APinf= np.matmul(A, Pinf)
+        Q= Pinf - np.matmul(APinf, A.transpose(0,2,1))
+        if not jac:
+            return Pinf, A, Q
+        # only lam depends on th[1], with dlam/dlth[1] = -lam, and A does not depend on th[0]
+        dNf= np.array([[1, 0, 0], [0, 1, 0], [-3*lam**2, -6*lam, -2]])
+        dA= np.zeros((len(dt), 2, 3, 3))
+        dA[:,1]= -lam*(-dt*A + ed*(dNf*dt + (np.dot(dNf, Nf) + np.dot(Nf, dNf))*dt**2/2))
+        dPinf= np.array([Pinf, -lam*th[0]*np.array([[0, 0, -2*lam/3], [0, 2*lam/3, 0],
+                                                     [-2*lam/3, 0, 4*lam**3]])])
+        # derivative of A Pinf A^T
+        dAPA= np.matmul(dA, np.matmul(Pinf, A.transpose(0,2,1))[:,None])
+        dAPA= dAPA + dAPA.transpose(0,1,3,2) + np.matmul(np.matmul(A[:,None], dPinf), A.transpose(0,2,1)[:,None])
+        return Pinf, A, Q, dPinf, dA, dPinf - dAPA
+
+
+    def kalmanfilter(self, lth, t, y, r, smooth= False, jac= False):
+        '''
+        Runs a Kalman filter, and optionally a Rauch-Tung-Striebel smoother, over time points sorted in increasing order and returns the negative log marginal likelihood and a dictionary of the filtered (and smoothed) means and covariances of the state and, if jac is True, the Jacobian of the negative log marginal likelihood with respect to the log hyperparameters ('jac').
+
+        The Jacobian is found by propagating the derivatives of the mean and covariance of the state through the filter (the sensitivity equations), which costs about three times as much as the filter alone, rather than the 2p + 1 filters of central differences for p hyperparameters, and is exact.
+
+        Arguments
+        --
+        lth: the log of the hyperparameters
+        t: a 1-d array of sorted time points
+        y: a 1-d array of the data (ignored where r is infinite)
+        r: a 1-d array of the variances of the measurement noise (infinite for time points without data), which must be proportional to the exponential of the last log hyperparameter if jac is True
+        smooth: if True, also run the smoother
+        jac: if True, also find the Jacobian
+        '''
+        n= len(t)
+        dt= np.diff(t, prepend= t[0])
+        if jac:
+            Pinf, A, Q, dPinf, dA, dQ= self.statespace(lth, dt, jac= True)
+            # derivatives with respect to the noise, the last hyperparameter, are zero
+            dPinf= np.concatenate((dPinf, np.zeros((1, 3, 3))))
+            dA= np.concatenate((dA, np.zeros((n, 1, 3, 3))), 1)
+            dQ= np.concatenate((dQ, np.zeros((n, 1, 3, 3))), 1)
+            dm, dP, dr= np.zeros((len(lth), 3)), dPinf, np.zeros(len(lth))
+            jacnlml= np.zeros(len(lth))
+        else:
+            Pinf, A, Q= self.statespace(lth, dt)
+        mp, Pp= np.empty((n, 3)), np.empty((n, 3, 3))
+        mf, Pf= np.empty((n, 3)), np.empty((n, 3, 3))
+        m, P= np.zeros(3), Pinf
+        nlml= 0
+        for k in range(n):
+            # predict
+            if jac:
+                dm= np.dot(dA[k], m) + np.dot(dm, A[k].T)
+                dAPA= np.matmul(dA[k], np.dot(P, A[k].T))
+                dP= dAPA + dAPA.transpose(0,2,1) + np.matmul(np.matmul(A[k], dP), A[k].T) + dQ[k]
+            m= np.dot(A[k], m)
+            P= np.dot(np.dot(A[k], P), A[k].T) + Q[k]
+            mp[k], Pp[k]= m, P
+            # update
+            if np.isfinite(r[k]):
+                S= P[0,0] + r[k]
+                if S <= 0:
+                    raise np.linalg.LinAlgError('Innovation variance is not positive')
+                v= y[k] - m[0]
+                K= P[:,0]/S
+                if jac:
+                    dr[-1]= r[k]
+                    dS= dP[:,0,0] + dr
+                    dv= -dm[:,0]
+                    dK= dP[:,:,0]/S - np.outer(dS, K)/S
+                    jacnlml += 0.5*(dS/S + 2*v*dv/S - v**2*dS/S**2)
+                    dm= dm + dK*v + np.outer(dv, K)
+                    dKK= S*dK[:,:,None]*K[None,None,:]
+                    dP= dP - dKK - dKK.transpose(0,2,1) - dS[:,None,None]*np.outer(K, K)
+                m= m + K*v
+                P= P - np.outer(K, K)*S
+                nlml += 0.5*(np.log(2*np.pi*S) + v**2/S)
+            mf[k], Pf[k]= m, P
+        res= {'A': A, 'mp': mp, 'Pp': Pp, 'mf': mf, 'Pf': Pf}
+        if jac:
+            res['jac']= jacnlml
+        if smooth:
+            ms, Ps= mf.copy(), Pf.copy()
+            G= np.zeros((n, 3, 3))
+            for k in range(n-2, -1, -1):
+                G[k]= np.linalg.solve(Pp[k+1], np.dot(A[k+1], Pf[k])).T
+                ms[k]= mf[k] + np.dot(G[k], ms[k+1] - mp[k+1])
+                Ps[k]= Pf[k] + np.dot(np.dot(G[k], Ps[k+1] - Pp[k+1]), G[k].T)
+            res.update({'ms': ms, 'Ps': Ps, 'G': G})
+        return nlml, res
+
+
+    def sorteddata(self, lth):
+        '''
+        Returns the data sorted by time and the variances of the measurement noise.
+
+        Arguments
+        --
+        lth: the log of the hyperparameters
+        '''
+        i= np.argsort(self.x, kind= 'mergesort')
+        return self.x[i], self.y[i], self.noisevariance(lth, len(self.x))[i]
+
+
+    def factorize(self, lth, jac= False):
+        """
+        Nothing is factorized: the Kalman filter runs over all the data in O(N).
+
+        Arguments
+        --
+        lth: log of the hyperparameters
+        jac: ignored
+        """
+        return None
+
+
+    def updatefactorization(self, lth, noold):
+        """
+        Nothing is cached: the Kalman filter runs over all the data in O(N).
+
+        Arguments
+        --
+        lth: log of the hyperparameters
+        noold: number of data points before data were added
+        """
+        pass
+
+
+    def nlml(self, lth):
+        """
+        Returns negative of log marginal likelihood.
+
+        Arguments
+        --
+        lth: log of the hyperparameters
+        """
+        lth= np.asarray(lth, dtype= float)
+        return self.kalmanfilter(lth, *self.sorteddata(lth))[0]
+
+
+    def jacnlml(self, lth):
+        """
+        Returns the Jacobian of negative log marginal likelihood with respect to the log hyperparameters.
+
+        The Jacobian is exact and costs one pass of the Kalman filter, with a Python loop over the data, propagating the derivatives of the state as well as the state (see kalmanfilter).
+
+        Arguments
+        --
+        lth: log of the hyperparameters
+        """
+        return self.nlmljac(lth)[1]
+
+
+    def nlmljac(self, lth):
+        """
+        Returns negative of log marginal likelihood and its Jacobian from a single pass of the Kalman filter.
+
+        Arguments
+        --
+        lth: log of the hyperparameters
+        """
+        lth= np.asarray(lth, dtype= float)
+        nlml, res= self.kalmanfilter(lth, *self.sorteddata(lth), jac= True)
+        return nlml, res['jac']
+
+
+    def smooth(self, xnew):
+        '''
+        Returns the results of the Kalman filter and smoother run over the data interleaved with xnew, for which there are no data, with the positions of xnew in the sorted times ('inew').
+
+        Arguments
+        --
+        xnew: abscissa values for which predicted ordinate values are desired
+        '''
+        lth= self.lth_opt
+        n, nnew= len(self.x), len(xnew)
+        t= np.concatenate((self.x, xnew))
+        i= np.argsort(t, kind= 'mergesort')
+        y= np.concatenate((self.y, np.zeros(nnew)))[i]
+        r= np.concatenate((self.noisevariance(lth, n), np.inf*np.ones(nnew)))[i]
+        nlml, res= self.kalmanfilter(lth, t[i], y, r, smooth= True)
+        res['inew']= np.argsort(i, kind= 'mergesort')[n:]
+        return res
+
+
+    def predictmarginal(self, xnew, derivs= 0, chunksize= 1024):
+        '''
+        Returns the predicted means and variances of the latent function and, depending on derivs, its first and second derivatives at xnew, with the latent function in the first row, the first derivative in the second row, and the second derivative in the third row.
+
+        The Kalman smoother needs memory only linear in the numbers of data and predictions, and so xnew is not divided into blocks.
+
+        Arguments
+        --
+        xnew: abscissa values for which predicted ordinate values are desired
+        derivs: if 0, only the latent function is inferred; if 1, the latent function and the first derivative are inferred; if 2, the latent function and the first and second derivatives are inferred
+        chunksize: not used
+        '''
+        if not hasattr(self, 'lth_opt'):
+            raise gaussianprocessException(' Run gp.findhyperparameters() first before making predictions.')
+        res= self.smooth(np.asarray(xnew, dtype= float))
+        ms, Ps= res['ms'][res['inew']], res['Ps'][res['inew']]
+        return ms[:,:derivs+1].T, np.array([Ps[:,j,j] for j in range(derivs+1)])
+
+
+    def predict(self, xnew, merrorsnew= False, derivs= 0, addnoise= False):
+        """
+        Determines the predicted mean latent function (.f) and its variance (.fvar) and potentially the predicted mean first derivative (.df) and its variance (.dfvar) and the predicted mean second derivative (.ddf) and its variance (.ddfvar). Also .mnp is the predicted combined array of the mean latent function and its mean derivatives.
+
+        Only the variances are calculated and not the full covariance matrix.
+
+        Arguments
+        --
+        xnew: abscissa values for which predicted ordinate values are desired
+        merrorsnew: if specified, the expected measurements errors at xnew (need not be specified if xnew= x)
+        derivs: if 0, only the latent function is inferred; if 1, the latent function and the first derivative are inferred; if 2, the latent function and the first and second derivatives are inferred
+        addnoise: if True, add measuremnet noise to the predicted variance
+        """
+        xnew= np.asarray(xnew)
+        xold= len(self.x) == len(xnew) and (self.x == xnew).all()
+        if np.any(self.merrors) and not np.any(merrorsnew) and not xold:
+            print('Length of xnew is different from x.')
+            raise gaussianprocessException('Measurement errors were used to find the hyperparameters and measurement errors are therefore required for any predictions.')
+        elif not hasattr(self, 'lth_opt'):
+            raise gaussianprocessException(' Run gp.findhyperparameters() first before making predictions.')
+        self.xnew= xnew
+        lth= self.lth_opt
+        nnew= len(xnew)
+        res= self.smooth(xnew)
+        self.ssfit= res
+        ms, Ps= res['ms'][res['inew']], res['Ps'][res['inew']]
+        mnp= np.concatenate([ms[:,j] for j in range(derivs+1)])
+        varp= np.concatenate([Ps[:,j,j] for j in range(derivs+1)])
+        self.mnp= mnp
+        # for user
+        self.f= mnp[:nnew]
+        self.fvar= varp[:nnew]
+        if addnoise:
+            # add measurement error to the variance of the latent function
+            if np.any(self.merrors):
+                self.fvar= self.fvar + (np.exp(lth[-1])*self.merrors if xold else merrorsnew)
+            else:
+                self.fvar= self.fvar + np.exp(lth[-1])
+        if derivs > 0:
+            self.df= mnp[nnew:2*nnew]
+            self.dfvar= varp[nnew:2*nnew]
+        if derivs > 1:
+            self.ddf= mnp[2*nnew:]
+            self.ddfvar= varp[2*nnew:]
+        self.derivs= derivs
+
+
+    def sample(self, size= 1, rank= False):
+        '''
+        Generate samples from the Gaussian process as an array using backward sampling through the Kalman filter.
+
+        Arguments
+        --
+        size: number of samples
+        rank: ignored (backward sampling already costs O(N)); accepted so that all Gaussian processes can be sampled alike
+        '''
+        try:
+            res= self.ssfit
+        except AttributeError:
+            print( ' Run gp.predict() first before sampling.')
+            return
+        mf, Pf, mp, Pp, G= res['mf'], res['Pf'], res['mp'], res['Pp'], res['G']
+        n= len(mf)
+        s= np.empty((n, 3, size))
+        s[-1]= mf[-1][:,None] + np.dot(symsqrt(Pf[-1]), np.random.randn(3, size))
+        for k in range(n-2, -1, -1):
+            mk= mf[k][:,None] + np.dot(G[k], s[k+1] - mp[k+1][:,None])
+            Pk= Pf[k] - np.dot(np.dot(G[k], Pp[k+1]), G[k].T)
+            s[k]= mk + np.dot(symsqrt(Pk), np.random.randn(3, size))
+        s= s[res['inew']]
+        return np.concatenate([s[:,j,:] for j in range(self.derivs+1)])
+
+
+####
+
+class hyperparametercache:
+    '''
+    Optimal hyperparameters stored by metadata, such as the carbon source, temperature, and strain, to start the optimization of Gaussian processes fitting similar data, e.g.
+
+    hc= gp.hyperparametercache('hyperparameters.json')
+    g.findhyperparameters(5, hpcache= hc, hpkey= {'carbon': 'glucose', 'temp': 37})
+    print(hc.hits, hc.misses, hc.converged)
+
+    The counters record the number of look-ups that found (hits) or did not find (misses) hyperparameters and the number of optimizations started from cached hyperparameters that succeeded (converged).
+    '''
+    # number of random runs made in addition to a successful run from cached hyperparameters
+    extraruns= 1
+
+    def __init__(self, fname= False, extraruns= False):
+        '''
+        Creates a cache of hyperparameters, loading any previous contents.
+
+        Arguments
+        --
+        fname: if specified, the JSON file in which the cache is stored; it is updated whenever hyperparameters are added
+        extraruns: if specified, the number of random runs made in addition to a successful run from cached hyperparameters
+        '''
+        import json, os
+        self.fname= fname
+        if extraruns is not False: self.extraruns= extraruns
+        self.hits, self.misses, self.converged= 0, 0, 0
+        if fname and os.path.isfile(fname):
+            with open(fname) as f:
+                self.entries= json.load(f)
+        else:
+            self.entries= {}
+
+
+    def key(self, hpkey):
+        '''
+        Returns the string used to store hyperparameters for a dictionary of metadata.
+
+        Arguments
+        --
+        hpkey: a dictionary of metadata
+        '''
+        return '; '.join(str(k) + '= ' + str(hpkey[k]) for k in sorted(hpkey, key= str))
+
+
+    def get(self, hpkey):
+        '''
+        Returns the cached log hyperparameters for a dictionary of metadata or None if there are none.
+
+        Arguments
+        --
+        hpkey: a dictionary of metadata
+        '''
+        k= self.key(hpkey)
+        if k in self.entries:
+            self.hits += 1
+            return np.array(self.entries[k])
+        else:
+            self.misses += 1
+            return None
+
+
+    def put(self, hpkey, lth):
+        '''
+        Stores log hyperparameters for a dictionary of metadata and saves the cache if it has a file.
+
+        Arguments
+        --
+        hpkey: a dictionary of metadata
+        lth: the log hyperparameters
+        '''
+        self.entries[self.key(hpkey)]= [float(l) for l in lth]
+        if self.fname: self.save()
+
+
+    def copy(self):
+        '''
+        Returns a copy of the cache with the same entries but without a file and with counters of zero, such as for use in another process, whose updates can be added back with merge.
+        '''
+        hc= hyperparametercache(extraruns= self.extraruns)
+        hc.entries= dict(self.entries)
+        return hc
+
+
+    def merge(self, entries, hits= 0, misses= 0, converged= 0):
+        '''
+        Adds the entries and counters of a copy of the cache, such as one used in another process, and saves the cache once if it has a file.
+
+        Arguments
+        --
+        entries: a dictionary of the new or changed entries of the copy
+        hits, misses, converged: the counters of the copy
+        '''
+        self.entries.update(entries)
+        self.hits += hits
+        self.misses += misses
+        self.converged += converged
+        if self.fname and entries: self.save()
+
+
+    def save(self, fname= False):
+        '''
+        Saves the cache as a JSON file.
+
+        Arguments
+        --
+        fname: if specified, the name of the file; otherwise the file given when the cache was created
+        '''
+        import json
+        with open(fname or self.fname, 'w') as f:
+            json.dump(self.entries, f, indent= 1)
+
+
+####
+
+def symsqrt(P):
+    '''
+    Returns a square root of a symmetric positive semi-definite matrix, ignoring small negative eigenvalues from round-off.
+
+    Arguments
+    --
+    P: a symmetric matrix
+    '''
+    w, v= np.linalg.eigh(P)
+    return v*np.sqrt(np.maximum(w, 0))
+
+
 ####
 
 class gaussianprocessException(Exception):
@@ -1,10 +1,18 @@
+import concurrent.futures
+import functools
+import glob
+import hashlib
+import json
+import os
+import time
 import numpy as np
 import pandas as pd
 import scipy.io
 import tqdm
+from . import schema
 
 
-def clist_to_dataframe(clist_file, desired_props='default', added_props={},
+def clist_to_dataframe(clist_file, desired_props='default', added_props=None,
                        excluded_props=None, ip_dist=0.065):
     """
     Reads in a SuperSegger `clist` file and extracts the desired properties.
@@ -38,8 +46,9 @@ def clist_to_dataframe(clist_file, desired_props='default', added_props={},
     if type(excluded_props) == str:
         excluded_props = list(excluded_props)
 
-    # Load the clist file using scipy.
-    mat = scipy.io.loadmat(clist_file, squeeze_me=True)
+    # Load only the property names and values from the clist file.
+    mat = scipy.io.loadmat(clist_file, squeeze_me=True,
+                           variable_names=['def', 'data'])
 
     # Assemble a dictionary of the indices and key values.
     if desired_props == 'default':
@@ -54,22 +63,24 @@ def clist_to_dataframe(clist_file, desired_props='default', added_props={},
 
     defs = {key: value for value, key in enumerate(
         mat['def']) if key in desired_props}
-    # Generate an empty DataFrame with the desired columns.
-    for k, v in added_props.items():
-        desired_props.append(k)
-    df = pd.DataFrame([], columns=desired_props)
 
-    # Iterate through the clist and extrac the properties.
-    for i, cell in enumerate(mat['data']):
-        if type(cell) != np.float64:
+    # Each cell is a row of the data. A single cell is squeezed to 1D.
+    if np.size(mat['data']) > 0:
+        data = np.atleast_2d(mat['data'])
+    else:
+        data = np.empty((0, np.size(mat['def'])))
 
-            # Extract the properties and add to DataFrame
-            cell_dict = {key: cell[value] for key, value in defs.items()}
+    # Extract the properties of all cells in one slice. Properties not in
+    # the clist are left as NaN.
+    present = [prop for prop in desired_props if prop in defs]
+    df = pd.DataFrame(data[:, [defs[prop] for prop in present]],
+                      columns=present).reindex(columns=desired_props)
 
-            # Add any additional properties.
-            for k, v in added_props.items():
-                cell_dict[k] = v
-            df = df.append(cell_dict, ignore_index=True)
+    # Add any additional properties.
+    if added_props is None:
+        added_props = {}
+    for k, v in added_props.items():
+        df[k] = v
 
     # Rename the columns to accommodate pep8 style.
     if excluded_props is not None:
@@ -96,8 +107,8 @@ def clist_to_dataframe(clist_file, desired_props='default', added_props={},
 
     return df
 
-def parse_clists(clists, parse_position=True, added_props={},
-                 verbose=False, **kwargs):
+def parse_clists(clists, parse_position=True, added_props=None,
+                 verbose=False, workers=1, cache=None, **kwargs):
     """
     A helper function to iterate over a list of clist files. See
     `clist_to_dataframe` for function documentation.
@@ -115,6 +126,15 @@ def parse_clists(clists, parse_position=True, added_props={},
         an added property.
     verbose: bool
         If True, a progress bar will be displayed for the clist iteration.
+    workers: int
+        The number of processes over which the clist files are parsed. Default
+        is 1. The results are concatenated in the order of `clists`
+        regardless of the number of workers.
+    cache: str or None
+        A directory in which the parsed DataFrame of each clist file is kept.
+        If given, a file is only parsed if its path, size, modification time,
+        or the parsing options have changed since it was cached. See
+        `cached_clist_to_dataframe`.
 
     Returns
     -------
@@ -123,24 +143,167 @@ def parse_clists(clists, parse_position=True, added_props={},
         provided clist file.
     """
 
-    # Iterate through each item in the clists.
-    dfs = []
-    if verbose:
-        iterator = tqdm.tqdm(clists)
-    else:
-        iterator = clists
-    for i, c in enumerate(iterator):
-        # Parse the position.
-        pos = int(c.split('xy')[-1].split('/')[0])
+    # Assemble the added props of each file without modifying those given.
+    props = []
+    for c in clists:
+        _props = dict(added_props) if added_props is not None else {}
         if parse_position:
-            added_props['position'] = pos
-
-        # Pass the file to the parser.
-        df = clist_to_dataframe(c, added_props=added_props, **kwargs)
-        dfs.append(df)
+            _props['position'] = int(c.split('xy')[-1].split('/')[0])
+        props.append(_props)
+
+    # Pass each file to the parser, in parallel if desired.
+    parser = functools.partial(_parse_clist, cache=cache, **kwargs)
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            iterator = pool.map(parser, clists, props)
+            if verbose:
+                iterator = tqdm.tqdm(iterator, total=len(clists))
+            dfs = list(iterator)
+    else:
+        iterator = zip(clists, props)
+        if verbose:
+            iterator = tqdm.tqdm(iterator, total=len(clists))
+        dfs = [parser(c, p) for c, p in iterator]
     return pd.concat(dfs, ignore_index=True)
 
 
+def _parse_clist(clist_file, added_props, cache=None, **kwargs):
+    """
+    Parses a single clist file with `clist_to_dataframe`, or with
+    `cached_clist_to_dataframe` if a cache directory is given. This is defined
+    at the module level so that it can be sent to worker processes.
+    """
+    if cache is not None:
+        return cached_clist_to_dataframe(clist_file, cache,
+                                         added_props=added_props, **kwargs)
+    return clist_to_dataframe(clist_file, added_props=added_props, **kwargs)
+
+
+# Version of the layout of the cache entries, which is part of their keys.
+CACHE_FORMAT = 2
+
+# Codes of the null mask of object columns in the cache.
+_NOT_NULL, _NONE, _NAN = 0, 1, 2
+
+
+def clist_cache_key(clist_file, **kwargs):
+    """
+    Computes the key of a clist file in the on-disk cache from its absolute
+    path, size, and modification time and the options used to parse it.
+
+    Parameters
+    ----------
+    clist_file : str
+        Path to clist file of interest.
+    kwargs :
+        The keyword arguments passed to `clist_to_dataframe`.
+
+    Returns
+    -------
+    key : str
+        Two hexadecimal digests joined by a dash. The first identifies the
+        file and the parsing options, and the second changes whenever the
+        file is modified.
+    """
+    stat = os.stat(clist_file)
+    source = repr((os.path.abspath(clist_file), sorted(kwargs.items())))
+    version = repr((CACHE_FORMAT, stat.st_size, stat.st_mtime_ns))
+    return '-'.join(hashlib.sha1(ident.encode()).hexdigest()
+                    for ident in [source, version])
+
+
+def cached_clist_to_dataframe(clist_file, cache, **kwargs):
+    """
+    Reads in a SuperSegger `clist` file with `clist_to_dataframe`, keeping the
+    parsed DataFrame in an on-disk cache so that an unchanged file is only
+    parsed once.
+
+    The DataFrames are stored as uncompressed `.npz` files named by
+    `clist_cache_key`, with the columns of each dtype stacked as the
+    contiguous rows of one array. Object columns are stored as text together
+    with a mask of their `None` and `NaN` entries, and the dtype of each
+    column is restored when it is read, so that a cached DataFrame equals a
+    freshly parsed one. Changing the file or the parsing options changes the
+    key, so stale entries are never read, and the entry of an earlier version
+    of the file is deleted when the new one is written.
+
+    Parameters
+    ----------
+    clist_file : str
+        Path to clist file of interest.
+    cache : str
+        Directory of the cache. It is created if it does not exist.
+    kwargs :
+        Keyword arguments passed to `clist_to_dataframe`.
+
+    Returns
+    -------
+    df : pandas DataFrame
+        A tidy pandas DataFrame with extracted properties for all cells in the
+        clist file.
+    """
+    key = clist_cache_key(clist_file, **kwargs)
+    fname = os.path.join(cache, key + '.npz')
+    if os.path.exists(fname):
+        with np.load(fname) as cached:
+            noblocks = sum(f.startswith('block') for f in cached.files)
+            blocks = [cached[f'block{i}'] for i in range(noblocks)]
+            columns, dtypes = cached['columns'], cached['dtypes']
+            layout = cached['layout']
+        data = {}
+        for c, dtype, (b, r, mb, mr) in zip(columns, dtypes, layout):
+            values = blocks[b][r]
+            if mb >= 0:
+                values = values.astype(object)
+                values[blocks[mb][mr] == _NONE] = None
+                values[blocks[mb][mr] == _NAN] = np.nan
+            data[c] = pd.Series(values, dtype=dtype)
+        return pd.DataFrame(data, columns=list(columns))
+
+    df = clist_to_dataframe(clist_file, **kwargs)
+
+    # Group the columns by dtype, storing object columns as fixed-width
+    # strings and a mask of their nulls.
+    groups, layout = {}, []
+
+    def _stack(values):
+        rows = groups.setdefault(values.dtype.str, [])
+        rows.append(values)
+        return list(groups).index(values.dtype.str), len(rows) - 1
+
+    for c in df.columns:
+        values = df[c].to_numpy()
+        mask = (-1, -1)
+        if values.dtype == object:
+            isnull = pd.isnull(values)
+            isnone = np.array([v is None for v in values], dtype=bool)
+            codes = np.where(isnone, _NONE, np.where(isnull, _NAN, _NOT_NULL))
+            mask = _stack(codes.astype(np.int8))
+            values = np.where(isnull, '', values).astype(str)
+        layout.append(_stack(values) + mask)
+    blocks = {f'block{i}': np.array(rows).reshape(len(rows), len(df))
+              for i, rows in enumerate(groups.values())}
+
+    # Write to a temporary file first so that parallel workers never read a
+    # partially written entry.
+    os.makedirs(cache, exist_ok=True)
+    tmp = f'{fname}.{os.getpid()}.tmp.npz'
+    np.savez(tmp, columns=np.array(df.columns, dtype=str),
+             dtypes=np.array([str(d) for d in df.dtypes], dtype=str),
+             layout=np.array(layout, dtype=int).reshape(-1, 4), **blocks)
+    os.replace(tmp, fname)
+
+    # Delete the entries of earlier versions of the file.
+    source = key.split('-')[0]
+    for old in glob.glob(os.path.join(cache, source + '-*.npz')):
+        if old != fname and not old.endswith('.tmp.npz'):
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+    return df
+
+
 def morphological_filter(df, ip_dist, area_bounds=[0, 50], ar_bounds=[0, 1]):
     """
     """
@@ -177,48 +340,45 @@ def family_reunion(dilution_df, multi_xy=True, fluo_channel=2):
     fluct_df : Pandas DataFrame
         A DataFrame with the two intensity measurements, sum total, and square fluctuations.
     """
-    # Set up the DataFrame.
-    family_df = pd.DataFrame([], columns=['I_1', 'I_2', 'area_1', 'area_2'
-                                          'volume_1', 'volume_2'])
-
     # Determine what to groupby.
     if multi_xy == True:
         groupby = ['position', 'mother_id']
     else:
         groupby = ['mother_id']
 
-    # Group the growth dataframe and iterate.
-    grouped = dilution_df.groupby(groupby)
-    for g, d in grouped:
-        if multi_xy == True:
-            mom = g[-1]
-            pos = g[0]
-        else:
-            mom = g
-            pos = 0
-        if len(d) == 2:  # Ensure only single successful divisions.
-            ints = d[f'fluor{fluo_channel}_mean_death'].values
-            if sum(ints) > 0:
-                I_1, I_2 = ints
-                family_dict = {'I_1': I_1, 'I_2': I_2, 
-                               'parent_ID': mom,
-                               'sibling_ID_1': d['cell_id'].values[0],
-                               'sibling_ID_2': d['cell_id'].values[1],
-                               'error_frame': d['error_frame'].values[0],
-                               'area_1':d['area_death'].values[0], 
-                               'area_2':d['area_death'].values[1],
-                               'position':pos,
-                               'length_1_birth': d['long_axis_birth'].values[0],
-                               'length_2_birth': d['long_axis_birth'].values[1],
-                               'length_1_death': d['long_axis_death'].values[0],
-                               'length_2_death': d['long_axis_death'].values[1],
-                               'volume_1_birth': d['volume_birth'].values[0],
-                               'volume_2_birth': d['volume_birth'].values[1],
-                               'volume_1_death': d['volume_death'].values[0],
-                               'volume_2_death': d['volume_death'].values[1],
-                               'fractional_birth_area':d['area_birth'].values[0] / np.sum(d['area_birth'].values)}
-
-                family_df = family_df.append(family_dict, ignore_index=True)
+    # Sort the cells by family, keeping their order within each family.
+    df = dilution_df.dropna(subset=groupby)
+    df = df.iloc[np.lexsort([df[g].values for g in groupby[::-1]])]
+
+    # Find the first of each pair of siblings from single successful divisions.
+    keys = df[groupby].values
+    starts = np.flatnonzero(np.r_[True, np.any(keys[1:] != keys[:-1], axis=1)])
+    sizes = np.diff(np.r_[starts, len(df)])
+    first = starts[sizes == 2]
+    sib_1, sib_2 = df.iloc[first], df.iloc[first + 1]
+    ints = f'fluor{fluo_channel}_mean_death'
+    keep = (sib_1[ints].values + sib_2[ints].values) > 0
+    sib_1, sib_2 = sib_1[keep], sib_2[keep]
+
+    # Assemble the siblings side by side.
+    family_df = pd.DataFrame({'I_1': sib_1[ints].values, 'I_2': sib_2[ints].values,
+                              'parent_ID': sib_1['mother_id'].values,
+                              'sibling_ID_1': sib_1['cell_id'].values,
+                              'sibling_ID_2': sib_2['cell_id'].values,
+                              'error_frame': sib_1['error_frame'].values,
+                              'area_1': sib_1['area_death'].values,
+                              'area_2': sib_2['area_death'].values,
+                              'position': sib_1['position'].values if multi_xy == True else 0,
+                              'length_1_birth': sib_1['long_axis_birth'].values,
+                              'length_2_birth': sib_2['long_axis_birth'].values,
+                              'length_1_death': sib_1['long_axis_death'].values,
+                              'length_2_death': sib_2['long_axis_death'].values,
+                              'volume_1_birth': sib_1['volume_birth'].values,
+                              'volume_2_birth': sib_2['volume_birth'].values,
+                              'volume_1_death': sib_1['volume_death'].values,
+                              'volume_2_death': sib_2['volume_death'].values,
+                              'fractional_birth_area': sib_1['area_birth'].values /
+                              (sib_1['area_birth'].values + sib_2['area_birth'].values)})
 
     return family_df
 
@@ -278,4 +438,423 @@ def condition_filter(df, strain='dilution', carbon=None, temp=None, fc_min=0,
     if size != None:
         filt_df = filt_df[filt_df['size']==size]
     
-    return filt_df
\ No newline at end of file
+    return filt_df
+
+# Columns of the compiled lineage and snapshot tables. Their dtypes are given
+# by the schema in `mwc.schema`.
+LINEAGE_COLUMNS = list(schema.LINEAGE_DTYPES)
+SNAP_COLUMNS = ['area_death', 'fluor1_mean_death', 'fluor2_mean_death',
+                'strain', 'date', 'run_number', 'temp', 'atc_ngml', 'carbon',
+                'long_axis_death', 'short_axis_death', 'volume_birth',
+                'volume_death', 'area_birth']
+SNAP_RENAME = {'fluor1_mean_death': 'mean_yfp',
+               'fluor2_mean_death': 'mean_mCherry',
+               'area_death': 'area_pix', 'long_axis_death': 'length_um',
+               'short_axis_death': 'width_um'}
+
+
+def _parse_run_name(run):
+    """
+    Parses the date, run number, temperature, carbon source, and operator from
+    the name of an experiment folder.
+    """
+    name = os.path.basename(os.path.normpath(run))
+    date, run_number, temp, carbon, operator, _ = name.split('_')
+    return (int(date), int(run_number.split('r')[-1]),
+            int(temp.split('C')[0]), carbon, operator)
+
+
+def process_lineages(run, cache=None):
+    """
+    Parses the growth clists of a single experiment folder into a lineage
+    table of sibling pairs. No area filters are applied.
+
+    Parameters
+    ----------
+    run : str
+        Path to the experiment folder, named as
+        `date_run_temp_carbon_operator_strain` and containing a `growth`
+        subfolder.
+    cache : str or None
+        Directory of the on-disk cache of parsed clists. See
+        `cached_clist_to_dataframe`.
+
+    Returns
+    -------
+    lineages : pandas DataFrame
+        The sibling pairs of the growth positions with the columns and
+        dtypes of `mwc.schema.LINEAGE_DTYPES`.
+    """
+    date, run_number, temp, carbon, operator = _parse_run_name(run)
+
+    # Reunite the families of the growth clists.
+    growth = sorted(glob.glob(f'{run}/growth/*/*.mat'))
+    if len(growth) > 0:
+        cells = parse_clists(growth, cache=cache)
+        lineages = family_reunion(cells, fluo_channel=2)
+    else:
+        lineages = pd.DataFrame([], columns=LINEAGE_COLUMNS)
+    lineages['carbon'] = carbon
+    lineages['run_number'] = run_number
+    lineages['temp'] = temp
+    lineages['date'] = date
+    lineages = lineages[LINEAGE_COLUMNS].reset_index(drop=True)
+    return schema.enforce(lineages, schema.LINEAGE_DTYPES)
+
+
+def process_snaps(run, cache=None):
+    """
+    Parses the snapshot clists of a single experiment folder into a table of
+    the intensities of cells passing the morphological filter.
+
+    Parameters
+    ----------
+    run : str
+        Path to the experiment folder, named as
+        `date_run_temp_carbon_operator_strain` and containing a `snaps`
+        subfolder with one folder per strain and ATC concentration.
+    cache : str or None
+        Directory of the on-disk cache of parsed clists. See
+        `cached_clist_to_dataframe`.
+
+    Returns
+    -------
+    snaps : pandas DataFrame
+        The snapshot intensities with the columns of `SNAP_COLUMNS` renamed
+        by `SNAP_RENAME` and the dtypes of `mwc.schema.SNAP_DTYPES`.
+    """
+    date, run_number, temp, carbon, operator = _parse_run_name(run)
+
+    # Parse the snapshots of each strain and ATC concentration.
+    snaps = []
+    mean_auto_yfp, mean_delta_yfp = np.nan, np.nan
+    for s in sorted(glob.glob(f'{run}/snaps/*ng*')):
+        strain, conc = os.path.basename(s).split('_')
+        conc = float(conc.split('ngml')[0])
+        clists = sorted(glob.glob(f'{s}/*/*.mat'))
+        if len(clists) == 0:
+            continue
+        parsed = parse_clists(clists, cache=cache)
+        parsed = morphological_filter(parsed, ip_dist=0.065,
+                                      area_bounds=[0.1, 4],
+                                      ar_bounds=[0.1, 0.8])
+        parsed = parsed[parsed['error_frame'].isnull()].copy()
+        if strain == 'auto':
+            mean_auto_yfp = parsed['fluor1_mean_death'].mean()
+        if strain == 'delta':
+            mean_delta_yfp = parsed['fluor1_mean_death'].mean()
+
+        # Assign the identifiers.
+        parsed['strain'] = strain
+        parsed['carbon'] = carbon
+        parsed['atc_ngml'] = conc
+        parsed['run_number'] = run_number
+        parsed['temp'] = temp
+        parsed['operator'] = operator
+        parsed['date'] = date
+        snaps.append(parsed)
+    if len(snaps) > 0:
+        snaps = pd.concat(snaps, ignore_index=True)
+        snaps['fold_change'] = (snaps['fluor1_mean_death'] - mean_auto_yfp) / \
+                               (mean_delta_yfp - mean_auto_yfp)
+    else:
+        snaps = pd.DataFrame([], columns=SNAP_COLUMNS)
+    snaps = snaps[SNAP_COLUMNS].rename(columns=SNAP_RENAME)
+    return schema.enforce(snaps.reset_index(drop=True), schema.SNAP_DTYPES)
+
+
+def process_experiment(run, cache=None):
+    """
+    Parses the growth and snapshot clists of a single experiment folder. See
+    `process_lineages` and `process_snaps`.
+
+    Parameters
+    ----------
+    run : str
+        Path to the experiment folder.
+    cache : str or None
+        Directory of the on-disk cache of parsed clists.
+
+    Returns
+    -------
+    lineages, snaps : pandas DataFrames
+        The sibling pairs of the growth positions and the snapshot
+        intensities.
+    """
+    return process_lineages(run, cache=cache), process_snaps(run, cache=cache)
+
+
+def _timed_experiment(run, cache=None):
+    """
+    Runs `process_experiment` and also returns the time taken by each stage.
+    This is defined at the module level so that it can be sent to worker
+    processes.
+    """
+    start = time.perf_counter()
+    lineages = process_lineages(run, cache=cache)
+    middle = time.perf_counter()
+    snaps = process_snaps(run, cache=cache)
+    timings = {'lineages': middle - start,
+               'snaps': time.perf_counter() - middle}
+    return (lineages, snaps), timings
+
+
+def experiment_files(run):
+    """
+    Lists the size and modification time of all clist files of an experiment
+    folder, which is much faster than hashing their contents.
+
+    Parameters
+    ----------
+    run : str
+        Path to the experiment folder.
+
+    Returns
+    -------
+    files : dict
+        The size in bytes and the modification time in nanoseconds of each
+        clist, keyed by its path relative to the folder.
+    """
+    files = {}
+    for fname in sorted(glob.glob(f'{run}/**/*.mat', recursive=True)):
+        stat = os.stat(fname)
+        files[os.path.relpath(fname, run)] = [stat.st_size, stat.st_mtime_ns]
+    return files
+
+
+def experiment_hash(run):
+    """
+    Computes a hash of the contents of all clist files of an experiment
+    folder, together with their paths relative to the folder.
+
+    Parameters
+    ----------
+    run : str
+        Path to the experiment folder.
+
+    Returns
+    -------
+    digest : str
+        A hexadecimal digest that changes whenever a clist is added, removed,
+        or modified.
+    """
+    digest = hashlib.sha1()
+    for fname in sorted(glob.glob(f'{run}/**/*.mat', recursive=True)):
+        digest.update(os.path.relpath(fname, run).encode())
+        with open(fname, 'rb') as f:
+            for block in iter(lambda: f.read(2**20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def compile_experiments(expts, lineage_file, snap_file, manifest_file,
+                        cache=None, workers=1, prune=True, timings=None,
+                        verbose=False):
+    """
+    Incrementally compiles the lineage and snapshot tables of many experiment
+    folders, processing only those that are new or whose clists changed.
+
+    A JSON manifest records, for each compiled experiment folder, the hash of
+    its clists (see `experiment_hash`), their sizes and modification times
+    (see `experiment_files`), and the range of rows of its partition in each
+    compiled table. The clists are only hashed again if their sizes or
+    modification times changed. The tables are written without an index and
+    read with the dtypes of `mwc.schema`. New experiments are appended to the
+    compiled tables. The partitions of changed or removed experiments are
+    dropped and the tables rewritten. If the manifest or either table is
+    missing, everything is compiled from scratch.
+
+    Parameters
+    ----------
+    expts : list of str
+        Paths to the experiment folders. See `process_experiment`.
+    lineage_file, snap_file : str
+        Paths of the compiled lineage and snapshot CSV files.
+    manifest_file : str
+        Path of the JSON manifest.
+    cache : str or None
+        Directory of the on-disk cache of parsed clists.
+    workers : int
+        The number of processes over which whole experiment folders are
+        processed. Default is 1.
+    prune : bool
+        If True, compiled experiments that are not in `expts` are removed from
+        the compiled tables. If False, they are kept, so that a subset of the
+        experiments can be updated.
+    timings : dict or None
+        If a dict, the time in seconds spent scanning the experiments for
+        changes ('scan'), in the lineage and snapshot stages summed over the
+        experiments ('lineages' and 'snaps'), and in writing the outputs
+        ('write') is added to it.
+    verbose : bool
+        If True, a progress bar will be displayed for the experiments.
+
+    Returns
+    -------
+    processed : list of str
+        The names of the experiment folders that were processed.
+    """
+    if timings is None:
+        timings = {}
+    for stage in ['scan', 'lineages', 'snaps', 'write']:
+        timings.setdefault(stage, 0)
+    start = time.perf_counter()
+    manifest = {}
+    if all(os.path.exists(f) for f in [manifest_file, lineage_file, snap_file]):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+    # Find the new, changed, and removed experiments.
+    names = {os.path.basename(os.path.normpath(run)): run for run in expts}
+    files = {name: experiment_files(run) for name, run in names.items()}
+    hashes = {}
+    for name, run in names.items():
+        if manifest.get(name, {}).get('files') == files[name]:
+            hashes[name] = manifest[name]['hash']
+        else:
+            hashes[name] = experiment_hash(run)
+    todo = [name for name in sorted(names)
+            if manifest.get(name, {}).get('hash') != hashes[name]]
+    stale = [name for name in manifest
+             if name in todo or (prune and name not in names)]
+
+    # Record new modification times of clists whose contents are unchanged.
+    touched = [name for name in manifest if name in names
+               and name not in todo and manifest[name].get('files') != files[name]]
+    for name in touched:
+        manifest[name]['files'] = files[name]
+    timings['scan'] += time.perf_counter() - start
+    if len(todo) == 0 and len(stale) == 0:
+        if len(touched) > 0:
+            with open(manifest_file, 'w') as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+        return []
+
+    # Process the new and changed experiments, in parallel if desired.
+    parser = functools.partial(_timed_experiment, cache=cache)
+    runs = [names[name] for name in todo]
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            iterator = pool.map(parser, runs)
+            if verbose:
+                iterator = tqdm.tqdm(iterator, total=len(runs),
+                                     desc='Parsing experiments')
+            results = list(iterator)
+    else:
+        iterator = tqdm.tqdm(runs, desc='Parsing experiments') if verbose \
+            else runs
+        results = [parser(run) for run in iterator]
+    new = {}
+    for name, (pair, _timings) in zip(todo, results):
+        new[name] = pair
+        for stage, t in _timings.items():
+            timings[stage] += t
+    start = time.perf_counter()
+
+    append = len(stale) == 0 and len(manifest) > 0
+    dtypes = [schema.LINEAGE_DTYPES, schema.SNAP_DTYPES]
+    if append:
+        # Only the partitions of the new experiments are written.
+        tables = [None, None]
+        rows = [max([m['rows'][i][1] for m in manifest.values()])
+                for i in range(2)]
+    else:
+        # Drop the partitions of changed and removed experiments.
+        kept = [name for name in manifest if name not in stale]
+        tables, rows = [], [0, 0]
+        for i, fname in enumerate([lineage_file, snap_file]):
+            parts = []
+            if len(kept) > 0:
+                table = schema.read_table(fname, dtypes[i])
+                parts = [table.iloc[slice(*manifest[name]['rows'][i])]
+                         for name in kept]
+            tables.append(parts)
+        manifest = {name: manifest[name] for name in kept}
+        for name in kept:
+            for i in range(2):
+                lo, hi = manifest[name]['rows'][i]
+                manifest[name]['rows'][i] = [rows[i], rows[i] + hi - lo]
+                rows[i] += hi - lo
+
+    # Record the row ranges of the new partitions.
+    for name, pair in new.items():
+        manifest[name] = {'hash': hashes[name], 'files': files[name],
+                          'rows': []}
+        for i, part in enumerate(pair):
+            manifest[name]['rows'].append([rows[i], rows[i] + len(part)])
+            rows[i] += len(part)
+
+    # Write the compiled tables and then the manifest.
+    for i, fname in enumerate([lineage_file, snap_file]):
+        parts = [pair[i] for pair in new.values()]
+        if append:
+            table = schema.enforce(pd.concat(parts), dtypes[i])
+            table.to_csv(fname, mode='a', header=False, index=False)
+        else:
+            parts = tables[i] + parts
+            if len(parts) == 0:
+                # Every experiment was removed.
+                parts = [pd.DataFrame([], columns=list(dtypes[i]))]
+            table = schema.enforce(pd.concat(parts), dtypes[i])
+            table.to_csv(fname, index=False)
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    timings['write'] += time.perf_counter() - start
+    return todo
+
+
+def main(argv=None):
+    """
+    Runs the lineage and snapshot processing stages over the experiment
+    folders of a data root from the command line (`mwc-process`), updating
+    the compiled tables incrementally. See `compile_experiments`.
+    """
+    import argparse
+    import fnmatch
+    parser = argparse.ArgumentParser(prog='mwc-process',
+        description='Compile the lineage and snapshot tables from the '
+                    'SuperSegger clists of each experiment folder.')
+    parser.add_argument('root', help='data root containing the `preprocessed` '
+                        'folder of experiments')
+    parser.add_argument('-o', '--output', default=None,
+                        help='folder for the compiled tables and manifest '
+                        '(default is the data root)')
+    parser.add_argument('--only', nargs='+', default=None, metavar='NAME',
+                        help='only process experiment folders matching these '
+                        'names or glob patterns')
+    parser.add_argument('--since', type=int, default=None, metavar='YYYYMMDD',
+                        help='only process experiments on or after this date')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='number of processes over which experiment '
+                        'folders are spread (default is 1)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='do not cache parsed clists on disk')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='do not display progress')
+    args = parser.parse_args(argv)
+
+    # Select the experiments.
+    output = args.output if args.output is not None else args.root
+    expts = sorted(glob.glob(os.path.join(args.root, 'preprocessed', '201*')))
+    if args.only is not None:
+        expts = [e for e in expts if any(fnmatch.fnmatch(os.path.basename(e), p)
+                                         for p in args.only)]
+    if args.since is not None:
+        expts = [e for e in expts if _parse_run_name(e)[0] >= args.since]
+    cache = None if args.no_cache else os.path.join(output, 'clist_cache')
+
+    timings = {}
+    start = time.perf_counter()
+    processed = compile_experiments(expts,
+                    lineage_file=os.path.join(output, 'raw_compiled_lineages.csv'),
+                    snap_file=os.path.join(output, 'raw_compiled_snaps.csv'),
+                    manifest_file=os.path.join(output, 'raw_compiled_manifest.json'),
+                    cache=cache, workers=args.workers,
+                    prune=args.only is None and args.since is None,
+                    timings=timings, verbose=not args.quiet)
+    timings['total'] = time.perf_counter() - start
+    if not args.quiet:
+        print(f'Processed {len(processed)} of {len(expts)} selected experiments.')
+        for stage, t in timings.items():
+            print(f'{stage:>10s}: {t:8.2f} s')
+    return processed
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+# Column dtypes of the compiled lineage table. Condition labels are
+# categorical, identifiers and positions are 32-bit integers, and measured
+# quantities are single precision, which is far finer than their noise.
+LINEAGE_DTYPES = {'I_1': 'float32', 'I_2': 'float32',
+                  'area_1': 'float32', 'area_2': 'float32',
+                  'parent_ID': 'int32', 'sibling_ID_1': 'int32',
+                  'sibling_ID_2': 'int32', 'carbon': 'category',
+                  'run_number': 'int32', 'temp': 'int32', 'date': 'int32',
+                  'volume_1_birth': 'float32', 'volume_2_birth': 'float32',
+                  'volume_1_death': 'float32', 'volume_2_death': 'float32',
+                  'length_1_birth': 'float32', 'length_2_birth': 'float32',
+                  'length_1_death': 'float32', 'length_2_death': 'float32',
+                  'position': 'int32'}
+
+# Column dtypes of the compiled snapshot table.
+SNAP_DTYPES = {'area_pix': 'float32', 'mean_yfp': 'float32',
+               'mean_mCherry': 'float32', 'strain': 'category',
+               'date': 'int32', 'run_number': 'int32', 'temp': 'int32',
+               'atc_ngml': 'float32', 'carbon': 'category',
+               'length_um': 'float32', 'width_um': 'float32',
+               'volume_birth': 'float32', 'volume_death': 'float32',
+               'area_birth': 'float32'}
+
+
+def enforce(df, dtypes):
+    """
+    Casts the columns of a DataFrame to the dtypes of a schema.
+
+    Parameters
+    ----------
+    df : pandas DataFrame
+        The table to be cast. It must have every column of the schema.
+    dtypes : dict
+        The schema as a dictionary of column names and dtypes, such as
+        `LINEAGE_DTYPES` or `SNAP_DTYPES`.
+
+    Returns
+    -------
+    typed : pandas DataFrame
+        A copy of the table with its columns cast. Columns not in the schema
+        are kept unchanged.
+
+    Raises
+    ------
+    ValueError
+        If a column of the schema is missing, or if a column cannot be cast,
+        such as an integer column containing missing values.
+    """
+    missing = [c for c in dtypes if c not in df.columns]
+    if len(missing) > 0:
+        raise ValueError(f'Columns {missing} of the schema are missing.')
+    try:
+        return df.astype(dtypes)
+    except (TypeError, ValueError) as err:
+        raise ValueError(f'The table does not match the schema: {err}')
+
+
+def read_table(fname, dtypes, **kwargs):
+    """
+    Reads a compiled CSV table with the dtypes of a schema.
+
+    Parameters
+    ----------
+    fname : str
+        Path to the CSV file.
+    dtypes : dict
+        The schema as a dictionary of column names and dtypes.
+    kwargs :
+        Keyword arguments passed to `pandas.read_csv`.
+
+    Returns
+    -------
+    df : pandas DataFrame
+        The table with its columns cast to the schema.
+    """
+    kwargs.setdefault('comment', '#')
+    # Parse directly into the dtypes and then check that every column exists.
+    return enforce(pd.read_csv(fname, dtype=dtypes, **kwargs), dtypes)
+
+
+def read_lineages(fname, **kwargs):
+    """
+    Reads a compiled lineage table with the dtypes of `LINEAGE_DTYPES`. See
+    `read_table`.
+    """
+    return read_table(fname, LINEAGE_DTYPES, **kwargs)
+
+
+def read_snaps(fname, **kwargs):
+    """
+    Reads a compiled snapshot table with the dtypes of `SNAP_DTYPES`. See
+    `read_table`.
+    """
+    return read_table(fname, SNAP_DTYPES, **kwargs)
@@ -14,5 +14,9 @@ setup(
         'Programming Language :: Python :: 3',
     ],
     author="Griffin Chure",
-    author_email="gchure@caltech.edu"
+    author_email="gchure@caltech.edu",
+    packages=find_packages(),
+    entry_points={
+        'console_scripts': ['mwc-process=mwc.process:main'],
+    },
 )
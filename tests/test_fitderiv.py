@@ -0,0 +1,105 @@
+import os
+import numpy as np
+import pandas as pd
+import mwc.fitderiv
+import mwc.gaussianprocess
+
+PLATE = os.path.join(os.path.dirname(__file__), '..', 'data',
+                     'example_growth_plate.csv')
+
+
+def read_plate(wells):
+    data = pd.read_csv(PLATE)
+    return data[data['well_id'].isin(wells)]
+
+
+def test_fitplate_isolates_failures():
+    data = read_plate([27, 28])
+    data = data[data['time_min'] <= 1000].iloc[::4]
+    broken = data[data['well_id'] == 28].copy()
+    broken['well_id'] = 99
+    broken['od_sub'] = np.nan
+    data = pd.concat([data, broken])
+    stats, curves, errors = mwc.fitderiv.fitplate(data, verbose=False, seed=0,
+                                                  noruns=2, stats=False)
+    assert errors['well_id'].tolist() == [99]
+    assert sorted(curves['well_id'].unique()) == [27, 28]
+    assert 'log(OD)' in curves.columns
+    assert np.all(np.isfinite(curves['gr']))
+
+    # The curves are labelled by what was fitted.
+    _, curves, _ = mwc.fitderiv.fitplate(data[data['well_id'] == 27],
+                                         verbose=False, seed=0, noruns=2,
+                                         stats=False, logs=False)
+    assert 'OD' in curves.columns and 'log(OD)' not in curves.columns
+
+
+def test_fitexpwindow_single_run():
+    # A single optimization run used to give a flat first fit and a window
+    # at the end of these curves.
+    data = read_plate([15, 16, 17])
+    for w, wd in data.groupby('well_id'):
+        wd = wd.sort_values('time_min')
+        t, od = wd['time_min'].values, wd['od_sub'].values
+        np.random.seed(0)
+        res, q = mwc.fitderiv.fitexpwindow(t, od, noruns=1, stats=False)
+        assert res['window start'] < 200 and res['window end'] < 400
+        assert 0.009 < res['growth rate'] < 0.012
+
+    # A degenerate first fit falls back to fitting all the data.
+    np.random.seed(0)
+    res, q = mwc.fitderiv.fitexpwindow(t, od, noruns=5, stats=False,
+                                       firstargs={'noruns': 1})
+    assert res['window start'] == t[0] and res['window end'] == t[-1]
+    assert res['growth rate'] > 0
+
+
+def test_fitplate_window():
+    data = read_plate([15, 16, 17])
+    stats, curves, errors = mwc.fitderiv.fitplate(data, verbose=False, seed=0,
+                                                  window=True, noruns=1,
+                                                  nosamples=20)
+    assert len(errors) == 0
+    rates = stats[stats['parameter'] == 'growth rate']['value']
+    assert len(rates) == 3 and np.all((rates > 0.009) & (rates < 0.012))
+
+
+def test_save_and_load(tmp_path):
+    data = read_plate([27]).iloc[::3]
+    t, od = data['time_min'].values, data['od_sub'].values
+    # The second fit has hyperparameters at bounds.
+    for bd in [False, {0: [-1, 0], 2: [-1, 0]}]:
+        np.random.seed(0)
+        q = mwc.fitderiv.fitderiv(t, od, noruns=2, nosamples=20, bd=bd)
+        assert len(q.hparamerr) == (2 if bd else 0)
+        fname = str(tmp_path / 'fit.npz')
+        q.save(fname)
+        for mmap in [False, True]:
+            r = mwc.fitderiv.loadfit(fname, mmap=mmap)
+            for a in ['t', 'd', 'f', 'fvar', 'df', 'dfvar', 'lth']:
+                assert np.array_equal(getattr(r, a), getattr(q, a))
+            assert r.logmaxlike == q.logmaxlike and r.logs == q.logs
+            assert r.ds == q.ds
+            assert r.hparamerr == q.hparamerr
+            assert all(type(i) is int for i, b in r.hparamerr)
+            # The saved factor is reused so that rebuilding does not factorize.
+            g = r.rebuild()
+            assert g.linalgcounts['cholesky'] == 0
+            assert g.hparamerr == q.g.hparamerr
+            assert np.allclose(g.f, q.f) and np.allclose(g.df, q.df)
+            f, df, ddf = r.sample(5, newt=np.linspace(0, 1000, 50))
+            assert f.shape == (50, 5)
+
+
+def test_fitplate_workers_cache(tmp_path):
+    data = read_plate([27, 28])
+    data = data[data['time_min'] <= 1000].iloc[::4]
+    fname = str(tmp_path / 'hp.json')
+    hpcache = mwc.gaussianprocess.hyperparametercache(fname)
+    stats, curves, errors = mwc.fitderiv.fitplate(data, workers=2, verbose=False,
+                                                  seed=0, noruns=2, stats=False,
+                                                  hpcache=hpcache)
+    assert len(errors) == 0
+    # The fits in the other processes update the cache of the caller.
+    assert hpcache.misses == 2 and len(hpcache.entries) == 1
+    assert mwc.gaussianprocess.hyperparametercache(fname).entries == hpcache.entries
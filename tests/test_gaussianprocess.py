@@ -0,0 +1,247 @@
+import os
+import time
+import numpy as np
+import pytest
+import mwc.gaussianprocess as gp
+
+
+def growth_curve(n, seed=0):
+    rng = np.random.RandomState(seed)
+    t = np.sort(rng.uniform(0, 1440, n))
+    y = np.log(0.01 + 0.4 / (1 + np.exp(-(t - 600) / 80))) + 0.01 * rng.randn(n)
+    return t, y
+
+
+KERNELS = {'lnGP': 2, 'nnGP': 2, 'sqexpGP': 2, 'sqexplinGP': 3, 'maternGP': 2}
+
+
+def test_covmatrix():
+    x = np.linspace(0, 5, 30)
+    rng = np.random.RandomState(0)
+    for name, noparams in KERNELS.items():
+        g = getattr(gp, name)({i: (-2, 2) for i in range(noparams + 1)}, x, x)
+        lth = rng.uniform(-1, 1, noparams + 1)
+        # A small block size assembles the matrix over several blocks.
+        k, jk = g.covmatrix(x, x[:20], lth, blocksize=100)
+        for i in range(len(x)):
+            ki, jki = g.covfn(x[i], x[:20], lth)
+            assert np.allclose(k[i], ki) and np.allclose(jk[i], jki)
+
+
+def numjac(fn, lth, h=1E-5):
+    lth = np.asarray(lth, dtype=float)
+    return np.array([(fn(lth + h * e) - fn(lth - h * e)) / (2 * h)
+                     for e in np.identity(len(lth))])
+
+
+def test_nlmljac():
+    t, y = growth_curve(60)
+    t = t / 100
+    merrors = np.random.RandomState(1).uniform(0.5, 2, len(t))
+    rng = np.random.RandomState(0)
+    for name, noparams in KERNELS.items():
+        for m in [False, merrors]:
+            g = getattr(gp, name)({i: (-2, 2) for i in range(noparams + 1)}, t, y,
+                                  merrors=m)
+            lth = np.append(rng.uniform(-1, 1, noparams), -3)
+            nlml, jac = g.nlmljac(lth)
+            # One factorization gives both.
+            assert g.linalgcounts['cholesky'] == 1
+            assert np.isclose(nlml, g.nlml(lth))
+            assert np.allclose(jac, numjac(g.nlml, lth), rtol=1E-4, atol=1E-6)
+
+
+def test_sparse():
+    t, y = growth_curve(60)
+    t = t / 100
+    rng = np.random.RandomState(0)
+    for name in ['nnGP', 'sqexpGP', 'sqexplinGP', 'maternGP']:
+        noparams = KERNELS[name]
+        bds = {i: (-2, 2) for i in range(noparams + 1)}
+        lth = np.append(rng.uniform(-1, 1, noparams), -3)
+        for approx in ['vfe', 'fitc']:
+            g = getattr(gp, 'sparse' + name)(bds, t, y, noinducing=15, approx=approx)
+            nlml, jac = g.nlmljac(lth)
+            assert np.isclose(nlml, g.nlml(lth))
+            assert np.allclose(jac, numjac(g.nlml, lth), rtol=1E-4, atol=1E-6)
+        # With an inducing point at each datum, the approximations are exact.
+        x = np.linspace(0, 5, 30)
+        dense = getattr(gp, name)(bds, x, np.sin(x))
+        for approx in ['vfe', 'fitc']:
+            g = getattr(gp, 'sparse' + name)(bds, x, np.sin(x), noinducing=30,
+                                             approx=approx)
+            assert np.isclose(g.nlml(lth), dense.nlml(lth), rtol=1E-5)
+            g.lth_opt = dense.lth_opt = lth
+            g.predict(x, derivs=1)
+            dense.predict(x, derivs=1)
+            assert np.allclose(g.f, dense.f, atol=1E-5)
+            assert np.allclose(g.df, dense.df, atol=1E-4)
+
+
+def fitted_sqexp(n=50):
+    t, y = growth_curve(n)
+    g = gp.sqexpGP({0: (-5, 5), 1: (-6, 2), 2: (-5, 2)}, t, y)
+    g.lth_opt = np.array([1.45, -11.4, -9.15])
+    return g
+
+
+def test_lazy_covp():
+    g = fitted_sqexp()
+    tnew = np.linspace(0, 1440, 40)
+    g.predict(tnew, derivs=2)
+    assert g._predcov['covp'] is None
+    covp = g.covp
+    assert covp.shape == (120, 120)
+    assert np.allclose(np.diagonal(covp), np.concatenate((g.fvar, g.dfvar, g.ddfvar)))
+    # The covariance of the latent function from its definition.
+    g.predict(tnew)
+    lth = g.lth_opt
+    kn = g.covmatrix(g.x, g.x, lth)[0] + np.diag(g.noisevariance(lth, len(g.x)))
+    kv = g.covmatrix(tnew, g.x, lth)[0]
+    expected = g.covmatrix(tnew, tnew, lth)[0] - np.dot(kv, np.linalg.solve(kn, kv.T))
+    assert np.allclose(g.covp, expected, atol=1E-8)
+
+
+def test_samplefactor():
+    g = fitted_sqexp()
+    g.predict(np.linspace(0, 1440, 40), derivs=1)
+    A = g.samplefactor()
+    scale = np.max(np.diagonal(g.covp))
+    assert np.allclose(np.dot(A, A.T), g.covp, atol=1E-6 * scale)
+    # The factor is kept until the next prediction.
+    assert g.samplefactor() is A
+    assert g.sample(7).shape == (80, 7)
+    Ar = g.samplefactor(rank=10)
+    assert Ar.shape == (80, 10)
+    assert np.all(np.sum(Ar**2, 1) <= np.diagonal(g.covp) + 1E-6 * scale)
+    assert g.sample(7, rank=10).shape == (80, 7)
+    g.predict(np.linspace(0, 1440, 30), derivs=1)
+    assert g.samplefactor().shape == (60, 60)
+
+
+def test_eigennoise():
+    t, y = growth_curve(80)
+    bds = {0: (-5, 5), 1: (-6, 2), 2: (-5, 2)}
+    g, ref = gp.sqexpGP(bds, t, y), gp.sqexpGP(bds, t, y)
+    g.eigennoise = True
+    lth = np.array([1.45, -11.4, -9.15])
+    g.nlml(lth)
+    # Only the noise changes, and so the eigenvalues are used.
+    for ln in [-8., -6., -4.]:
+        lthn = np.append(lth[:-1], ln)
+        assert np.isclose(g.nlml(lthn), ref.nlml(lthn))
+        assert np.allclose(g.jacnlml(lthn), ref.jacnlml(lthn), rtol=1E-6)
+    assert g.linalgcounts['noiseonly'] == 3 and g.linalgcounts['eigen'] == 1
+    # The profile likelihood is the likelihood at the optimal noise.
+    nlml, jac = g.profilenlmljac(lth[:-1])
+    lthp = np.append(lth[:-1], g.profilenoise(lth[:-1]))
+    assert np.isclose(nlml, ref.nlml(lthp))
+    assert np.allclose(jac, ref.jacnlml(lthp)[:-1], rtol=1E-4, atol=1E-4)
+    assert ref.nlml(lthp) <= min(ref.nlml(np.append(lth[:-1], lthp[-1] + d))
+                                 for d in [-0.1, 0.1])
+    g.findhyperparameters(2, seed=0, profile=True)
+    ref.findhyperparameters(2, seed=0)
+    assert np.isclose(g.nlml_opt, ref.nlml_opt, atol=1E-3)
+
+
+def test_predictmarginal():
+    g = fitted_sqexp()
+    tnew = np.linspace(0, 1440, 45)
+    g.predict(tnew, derivs=2)
+    # Blocks of predictions that do not divide the grid evenly.
+    mn, var = g.predictmarginal(tnew, derivs=2, chunksize=10)
+    assert np.allclose(mn, [g.f, g.df, g.ddf])
+    assert np.allclose(var, [g.fvar, g.dfvar, g.ddfvar])
+    mn, var = g.predictmarginal(tnew, chunksize=10)
+    assert mn.shape == var.shape == (1, 45)
+
+
+def test_jitter():
+    # Repeated abscissa and almost no noise give a singular kernel matrix.
+    x = np.repeat(np.linspace(0, 10, 20), 2)
+    g = gp.sqexpGP({0: (-5, 5), 1: (-6, 2), 2: (-20, 2)}, x, np.sin(x))
+    lth = np.array([0., -2., -40.])
+    assert np.isfinite(g.nlml(lth))
+    assert g.linalgcounts['jitter'] == 1
+    assert g.minjitter <= g.jitterused <= g.maxjitter
+    assert g._factorcache['jitter'] == g.jitterused
+    with pytest.raises(np.linalg.LinAlgError):
+        g.cholesky(-np.identity(3))
+
+
+def test_statespace_jacobian():
+    t, y = growth_curve(200)
+    bds = {0: (-5, 5), 1: (-4, 4), 2: (-5, 2)}
+    merrors = np.random.RandomState(1).uniform(0.5, 2, len(t))
+    for lth in [np.log([0.5, 150, 1E-4]), np.array([1., 3., -6.])]:
+        for m in [False, merrors]:
+            dense = gp.maternGP(bds, t, y, merrors=m)
+            ss = gp.maternssGP(bds, t, y, merrors=m)
+            nlml, jac = ss.nlmljac(lth)
+            assert np.isclose(nlml, dense.nlml(lth))
+            assert np.allclose(jac, dense.jacnlml(lth), rtol=1E-6)
+
+
+def test_workers():
+    t, y = growth_curve(60)
+    bds = {0: (-5, 5), 1: (-6, 2), 2: (-5, 2)}
+    serial, pooled = gp.sqexpGP(bds, t, y), gp.sqexpGP(bds, t, y)
+    serial.findhyperparameters(4, seed=3)
+    pooled.findhyperparameters(4, seed=3, workers=2)
+    assert np.array_equal(serial.lth_opt, pooled.lth_opt)
+    assert serial.nlml_opt == pooled.nlml_opt
+
+
+class slowsqexpGP(gp.sqexpGP):
+    # records each run that starts in a file of rundir
+    def optimizationrun(self, runseed, *args):
+        open(os.path.join(self.rundir, str(runseed)), 'w').close()
+        time.sleep(0.5)
+        return gp.sqexpGP.optimizationrun(self, runseed, *args)
+
+
+def test_workers_exitearly(tmp_path):
+    t, y = growth_curve(60)
+    g = slowsqexpGP({0: (-5, 5), 1: (-6, 2), 2: (-5, 2)}, t, y)
+    g.rundir = str(tmp_path)
+    g.findhyperparameters(12, exitearly=True, seed=3, workers=2)
+    # The runs yet to start when the first run succeeded are cancelled.
+    assert 1 <= len(os.listdir(str(tmp_path))) < 12
+    assert np.all(np.isfinite(g.lth_opt))
+
+
+def test_addobservations_reuses_options():
+    t, y = growth_curve(120)
+    g = gp.sqexpGP({0: (-5, 5), 1: (-6, 2), 2: (-5, 2)}, t[:100], y[:100])
+    hpcache = gp.hyperparametercache()
+    g.findhyperparameters(2, optmethod='tnc', seed=1, hpcache=hpcache,
+                          hpkey={'carbon': 'glucose'})
+    calls = []
+    findhyperparameters = g.findhyperparameters
+
+    def spy(**kwargs):
+        calls.append(kwargs)
+        return findhyperparameters(**kwargs)
+    g.findhyperparameters = spy
+    lth = g.lth_opt.copy()
+    assert g.addobservations(t[100:], y[100:], reoptevery=10)
+    assert len(calls) == 1 and np.array_equal(calls[0]['stvals'], lth)
+    assert calls[0]['noruns'] == 2 and calls[0]['optmethod'] == 'tnc'
+    assert calls[0]['hpcache'] is hpcache and hpcache.hits == 1
+
+
+def test_addobservations_extends_factor():
+    t, y = growth_curve(120)
+    g = gp.sqexpGP({0: (-5, 5), 1: (-6, 2), 2: (-5, 2)}, t[:100], y[:100])
+    # The last of these runs is not the best.
+    g.findhyperparameters(3, seed=0)
+    assert np.array_equal(g._factorcache['lth'], g.lth_opt)
+    nochol = g.linalgcounts['cholesky']
+    assert not g.addobservations(t[100:], y[100:])
+    # Only the block of the new points is factorized.
+    assert g.linalgcounts['cholesky'] == nochol + 1
+    fc = g._factorcache
+    assert len(fc['al']) == 120
+    full = gp.sqexpGP({0: (-5, 5), 1: (-6, 2), 2: (-5, 2)}, t, y)
+    assert np.allclose(fc['al'], full.factorize(g.lth_opt)['al'])
+    assert np.isclose(g.nlml_opt, full.nlml(g.lth_opt))
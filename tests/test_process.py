@@ -0,0 +1,122 @@
+import glob
+import json
+import os
+import numpy as np
+import pandas as pd
+import scipy.io
+import mwc.process
+import mwc.schema
+
+PROPS = ['Cell ID', 'Cell birth time', 'Cell death time', 'Error frame',
+         'Long axis (L) birth', 'Long axis (L) death', 'Short axis birth',
+         'Short axis death', 'Area birth', 'Area death', 'Mother ID',
+         'Daughter1 ID', 'Daughter2 ID', 'Fluor1 mean death',
+         'Fluor2 mean death', 'Fluor1 bg death', 'Fluor2 bg death',
+         'Cell Dist to Edge']
+
+
+def write_clist(fname, n, seed=0):
+    rng = np.random.RandomState(seed)
+    data = rng.uniform(1, 100, (n, len(PROPS)))
+    # Cells are the daughters of pairs of mothers.
+    data[:, PROPS.index('Cell ID')] = np.arange(n) + 1
+    data[:, PROPS.index('Mother ID')] = np.arange(n) // 2 + n + 1
+    # Most cells have no error frame.
+    data[rng.rand(n) < 0.8, PROPS.index('Error frame')] = np.nan
+    scipy.io.savemat(fname, {'def': np.array(PROPS, dtype=object),
+                             'data': data})
+
+
+def test_cache_round_trip(tmp_path):
+    clist = str(tmp_path / 'clist.mat')
+    cache = str(tmp_path / 'cache')
+    write_clist(clist, 50)
+    props = {'position': 3, 'strain': None, 'operator': 'O2'}
+    fresh = mwc.process.clist_to_dataframe(clist, added_props=props)
+    miss = mwc.process.cached_clist_to_dataframe(clist, cache,
+                                                 added_props=props)
+    hit = mwc.process.cached_clist_to_dataframe(clist, cache,
+                                                added_props=props)
+    assert len(glob.glob(os.path.join(cache, '*.npz'))) == 1
+    pd.testing.assert_frame_equal(miss, fresh)
+    pd.testing.assert_frame_equal(hit, fresh)
+    assert hit['strain'].isnull().all()
+    assert hit['error_frame'].isnull().sum() == fresh['error_frame'].isnull().sum()
+
+
+def test_cache_replaces_stale_entry(tmp_path):
+    clist = str(tmp_path / 'clist.mat')
+    cache = str(tmp_path / 'cache')
+    write_clist(clist, 50)
+    mwc.process.cached_clist_to_dataframe(clist, cache)
+    # Rewrite the clist with other cells and a later modification time.
+    write_clist(clist, 30, seed=1)
+    stat = os.stat(clist)
+    os.utime(clist, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    hit = mwc.process.cached_clist_to_dataframe(clist, cache)
+    assert len(glob.glob(os.path.join(cache, '*.npz'))) == 1
+    pd.testing.assert_frame_equal(hit, mwc.process.clist_to_dataframe(clist))
+    hit = mwc.process.cached_clist_to_dataframe(clist, cache)
+    pd.testing.assert_frame_equal(hit, mwc.process.clist_to_dataframe(clist))
+
+
+def make_experiment(root, date, seed=0):
+    run = os.path.join(str(root), f'{date}_r1_37C_glucose_O2_dilution')
+    for pos in [1, 2]:
+        os.makedirs(os.path.join(run, 'growth', f'xy{pos:02d}'))
+        write_clist(os.path.join(run, 'growth', f'xy{pos:02d}', 'clist.mat'),
+                    20, seed=seed + pos)
+    return run
+
+
+def compile_files(tmp_path):
+    return {'lineage_file': str(tmp_path / 'lineages.csv'),
+            'snap_file': str(tmp_path / 'snaps.csv'),
+            'manifest_file': str(tmp_path / 'manifest.json')}
+
+
+def test_compile_incremental(tmp_path, monkeypatch):
+    expts = [make_experiment(tmp_path, date, seed)
+             for seed, date in enumerate([20190101, 20190102, 20190103])]
+    files = compile_files(tmp_path)
+    assert len(mwc.process.compile_experiments(expts, **files)) == 3
+
+    # Removing an experiment prunes its partition.
+    kept = [expts[0], expts[2]]
+    assert mwc.process.compile_experiments(kept, **files) == []
+    lineages = mwc.schema.read_lineages(files['lineage_file'])
+    expected = pd.concat([mwc.process.process_lineages(e) for e in kept],
+                         ignore_index=True)
+    pd.testing.assert_frame_equal(lineages, expected)
+    with open(files['manifest_file']) as f:
+        manifest = json.load(f)
+    assert sorted(manifest) == sorted(os.path.basename(e) for e in kept)
+
+    # Only a changed experiment is processed again.
+    clist = os.path.join(expts[2], 'growth', 'xy01', 'clist.mat')
+    write_clist(clist, 30, seed=10)
+    names = mwc.process.compile_experiments(kept, **files)
+    assert names == [os.path.basename(expts[2])]
+    lineages = mwc.schema.read_lineages(files['lineage_file'])
+    expected = pd.concat([mwc.process.process_lineages(e) for e in kept],
+                         ignore_index=True)
+    pd.testing.assert_frame_equal(lineages, expected)
+
+    # Unchanged clists are not hashed again.
+    def no_hash(run):
+        raise AssertionError(f'{run} was hashed')
+    monkeypatch.setattr(mwc.process, 'experiment_hash', no_hash)
+    assert mwc.process.compile_experiments(kept, **files) == []
+
+
+def test_compile_all_removed(tmp_path):
+    files = compile_files(tmp_path)
+    expts = [make_experiment(tmp_path, 20190101)]
+    mwc.process.compile_experiments(expts, **files)
+    assert mwc.process.compile_experiments([], **files) == []
+    lineages = mwc.schema.read_lineages(files['lineage_file'])
+    snaps = mwc.schema.read_snaps(files['snap_file'])
+    assert len(lineages) == 0 and len(snaps) == 0
+    assert dict(lineages.dtypes.astype(str)) == mwc.schema.LINEAGE_DTYPES
+    with open(files['manifest_file']) as f:
+        assert json.load(f) == {}
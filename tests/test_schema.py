@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+import mwc.schema
+
+
+def lineage_table(n=4):
+    table = {}
+    for c, dtype in mwc.schema.LINEAGE_DTYPES.items():
+        if dtype == 'category':
+            table[c] = ['glucose'] * n
+        elif dtype == 'int32':
+            table[c] = np.arange(n, dtype=np.int64)
+        else:
+            table[c] = np.linspace(1, 2, n)
+    return pd.DataFrame(table)
+
+
+def test_enforce():
+    typed = mwc.schema.enforce(lineage_table(), mwc.schema.LINEAGE_DTYPES)
+    assert dict(typed.dtypes.astype(str)) == mwc.schema.LINEAGE_DTYPES
+
+
+def test_enforce_malformed():
+    dtypes = mwc.schema.LINEAGE_DTYPES
+    with pytest.raises(ValueError, match='missing'):
+        mwc.schema.enforce(lineage_table().drop(columns='date'), dtypes)
+    table = lineage_table()
+    table['parent_ID'] = table['parent_ID'].astype(float)
+    table.loc[1, 'parent_ID'] = np.nan
+    with pytest.raises(ValueError):
+        mwc.schema.enforce(table, dtypes)
+    table = lineage_table()
+    table['temp'] = table['temp'].astype(object)
+    table.loc[2, 'temp'] = 'warm'
+    with pytest.raises(ValueError):
+        mwc.schema.enforce(table, dtypes)
+
+
+def test_read_malformed(tmp_path):
+    fname = str(tmp_path / 'lineages.csv')
+    table = lineage_table()
+    table.to_csv(fname, index=False)
+    lineages = mwc.schema.read_lineages(fname)
+    assert dict(lineages.dtypes.astype(str)) == mwc.schema.LINEAGE_DTYPES
+    table.loc[3, 'position'] = np.nan
+    table.to_csv(fname, index=False)
+    with pytest.raises(ValueError):
+        mwc.schema.read_lineages(fname)
+    table.drop(columns='position').to_csv(fname, index=False)
+    with pytest.raises(ValueError, match='missing'):
+        mwc.schema.read_lineages(fname)